@@ -0,0 +1,237 @@
+import argparse
+import configparser
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+_REPO_FOLDER = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_RESULTS_FOLDER = os.path.join(_REPO_FOLDER, 'benchmarks', 'results')
+_STAGES = ['discovery', 'excel_parse', 'get_config', 'partition', 'dmstask', 'government', 'dataquality', 'publish']
+# Stage of each span of the pipeline profiler, the spans of both schemas are added together
+_SPAN_STAGES = {
+    'get_last_lineage_file': 'discovery',
+    'parse_lineage_excel': 'excel_parse',
+    'get_config': 'get_config',
+    'partition_tables': 'partition',
+    'generate_dmstask': 'dmstask',
+    'generate_government_tables': 'government',
+    'generate_dataquality': 'dataquality',
+    'publish_outputs': 'publish'
+}
+
+sys.path.insert(0, _REPO_FOLDER)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from synthetic_lineage import build_workspace  # noqa: E402
+
+
+def parse_arguments():
+    '''
+        Function to parse the arguments of the benchmark.
+        Returns:
+            argparse.Namespace: Arguments of the benchmark
+    '''
+    parser = argparse.ArgumentParser(description='Benchmark of the generation stages with a synthetic lineage.')
+    parser.add_argument('--views', type=int, default=200, help='Number of legacy views of the synthetic lineage')
+    parser.add_argument('--fields', type=int, default=30, help='Number of fields of each view')
+    parser.add_argument('--legacy', default='APET', help='Legacy name of the synthetic lineage')
+    parser.add_argument('--repeat', type=int, default=3, help='Number of runs of each stage')
+    parser.add_argument('--seed', type=int, default=1, help='Seed of the synthetic lineage')
+    parser.add_argument('--output', help='Path of the JSON results, by default benchmarks/results/<commit>_<views>x<fields>.json')
+    parser.add_argument('--compare', help='JSON results of a previous run to compare with')
+    parser.add_argument('--threshold', type=float, default=1.10,
+                        help='Median ratio over the compared results reported as a regression')
+
+    return parser.parse_args()
+
+
+def prepare_workspace(folder: str, args):
+    '''
+        Function to create the workspace of the benchmark, with the synthetic inputs and a config
+        that writes every output inside the workspace.
+        Parameters:
+            folder (str): Folder of the workspace
+            args (argparse.Namespace): Arguments of the benchmark
+    '''
+    build_workspace(folder, args.legacy, args.views, args.fields, args.seed)
+
+    bench_config = configparser.ConfigParser()
+    bench_config.read(os.path.join(_REPO_FOLDER, 'cfg', 'configs', 'config.cfg'))
+    bench_config['folders']['lineaje_folder'] = f'{folder}/inputs/linajes/'
+    bench_config['folders']['parameter_file_folder'] = f'{folder}/cfg/params/master_fields.csv'
+    bench_config['folders']['output_folder'] = f'{folder}/outputs'
+    bench_config['folders']['lineage_cache_folder'] = f'{folder}/cache/lineage'
+    bench_config['logging']['level'] = 'WARNING'
+    # Measure the real parse every run, and every stage on its own
+    bench_config['cache']['active'] = 'False'
+    bench_config['execution']['mode'] = 'serial'
+    # The stages are timed with the spans of the profiler, without the overhead of tracing the memory
+    bench_config['profile']['trace_memory'] = 'False'
+    bench_config['folders']['profile_folder'] = f'{folder}/profiles'
+
+    os.makedirs(f'{folder}/cfg/configs', exist_ok=True)
+    with open(f'{folder}/cfg/configs/config.cfg', 'w') as fp:
+        bench_config.write(fp)
+
+
+def run_stages(legacy: str):
+    '''
+        Function to generate a legacy once with the pipeline, profiled, and get the time of each stage
+        from the spans of the profiler.
+        The functions are imported here, so the synthetic inputs are created before loading pandas.
+        Parameters:
+            legacy (str): Legacy name
+        Returns:
+            dict: Seconds spent in each stage
+    '''
+    import functions.catalog_functions as catalog_functions
+    from config import config
+    from functions.generic_functions import delete_folder
+    from functions.pipeline_functions import process_legacy
+
+    # Generate every table in every run, the manifest of the previous run would skip all of them
+    delete_folder(config.getpath('folders', 'output_folder'))
+    # Load the master fields again in every run
+    catalog_functions._CATALOG = None
+
+    result = process_legacy(legacy, profile=False)
+    if result['errors']:
+        # A failed run is not a valid measure
+        raise RuntimeError(f"Error generating {legacy}: {'; '.join(result['errors'])}")
+
+    timings = dict.fromkeys(_STAGES, 0.0)
+    for span in result['profile']['spans']:
+        stage = _SPAN_STAGES.get(span['name'])
+        if stage is not None:
+            timings[stage] += span['wall_seconds']
+
+    return timings
+
+
+def summarize(runs: list):
+    '''
+        Function to summarize the timings of several runs.
+        Parameters:
+            runs (list): Timings of each run, as returned by run_stages
+        Returns:
+            dict: Runs, min, median and mean seconds of each stage and of the whole run
+    '''
+    stages = {}
+    for stage in _STAGES + ['total']:
+        values = [sum(run.values()) if stage == 'total' else run[stage] for run in runs]
+        stages[stage] = {
+            'runs': values,
+            'min': min(values),
+            'median': statistics.median(values),
+            'mean': statistics.mean(values)
+        }
+
+    return stages
+
+
+def compare(results: dict, baseline: dict, threshold: float):
+    '''
+        Function to print the comparison of the results with a previous run.
+        Parameters:
+            results (dict): Results of this run
+            baseline (dict): Results of the previous run
+            threshold (float): Median ratio reported as a regression
+        Returns:
+            list: Stages with a regression
+    '''
+    regressions = []
+    print(f"{'stage':<12} {baseline['commit']:>12} {results['commit']:>12} {'ratio':>8}")
+    for stage, summary in results['stages'].items():
+        previous = baseline['stages'].get(stage)
+        if previous is None:
+            continue
+        ratio = summary['median'] / previous['median'] if previous['median'] else float('inf')
+        flag = ''
+        if ratio > threshold:
+            flag = ' REGRESSION'
+            regressions.append(stage)
+        print(f"{stage:<12} {previous['median']:>12.4f} {summary['median']:>12.4f} {ratio:>8.2f}{flag}")
+
+    if baseline['parameters'] != results['parameters']:
+        print(f"Warning: parameters differ, {baseline['parameters']} vs {results['parameters']}")
+
+    return regressions
+
+
+def _get_lineage_engine():
+    '''
+        Function to get the engine that reads the lineage in the benchmark, the parse time depends on it.
+        Returns:
+            str: Engine used with the config of the benchmark
+    '''
+    from config import config
+    from functions.workbook_reader_functions import is_engine_available
+
+    engine = config.get('lineage', 'engine', fallback='openpyxl')
+    return engine if is_engine_available(engine) else 'openpyxl'
+
+
+def _get_commit():
+    '''
+        Function to get the commit of the repository being measured.
+        Returns:
+            str: Short hash of HEAD, with a + suffix if there are local changes, or unknown
+    '''
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=_REPO_FOLDER,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        changes = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=_REPO_FOLDER,
+                                 capture_output=True, text=True, check=True).stdout.strip()
+        return f'{commit}+' if changes else commit
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def main():
+    args = parse_arguments()
+    commit = _get_commit()
+    output = os.path.abspath(args.output or os.path.join(_RESULTS_FOLDER, f'{commit}_{args.views}x{args.fields}.json'))
+    baseline_path = os.path.abspath(args.compare) if args.compare else None
+
+    with tempfile.TemporaryDirectory(prefix='md_bench_') as folder:
+        prepare_workspace(folder, args)
+        from config import config
+        from logger import configure_logging
+        config.use_file(f'{folder}/cfg/configs/config.cfg', base_folder=folder)
+        configure_logging()
+        runs = [run_stages(args.legacy) for _ in range(args.repeat)]
+
+    import openpyxl
+    import pandas as pd
+    results = {
+        'commit': commit,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'openpyxl': openpyxl.__version__,
+        'lineage_engine': _get_lineage_engine(),
+        'parameters': {'views': args.views, 'fields': args.fields, 'legacy': args.legacy, 'seed': args.seed},
+        'stages': summarize(runs)
+    }
+
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w') as fp:
+        json.dump(results, fp, indent=4)
+
+    for stage, summary in results['stages'].items():
+        print(f"{stage:<12} median {summary['median']:.4f}s  min {summary['min']:.4f}s")
+    print(f'Results saved in {output}')
+
+    if baseline_path:
+        with open(baseline_path, 'r') as fp:
+            baseline = json.load(fp)
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+import csv
+import os
+import random
+from openpyxl import Workbook
+
+# Lineage sheets and the header of their legacy columns, as in the real lineage workbooks
+_SHEETS = {
+    'ruu': ('Linaje RUU', 'Tabla Legacy VM [FUENTE]'),
+    'russ': ('Linaje RUSS', 'Tabla Legacy [FUENTE]')
+}
+_COLUMN_GROUPS = [
+    ('LANDING', ['Nombre Campo', 'Tipo de dato', 'Obligatorio', 'Comentarios']),
+    ('STAGING', ['Campo', 'Tipo de dato', 'Obligatorio', 'Comentarios']),
+    ('Valores Formateados', [None])
+]
+_LEGACY_COLUMNS = ['Nombre Vista', 'Nombre Campo', 'Tipo de dato', 'Obligatorio', 'Valores']
+# (check_field_type, field_type, field_length) of the master fields, in the proportions of the real file
+_FIELD_TYPES = [
+    ('timestamp', 'timestamp', ''), ('timestamp', 'timestamp', ''), ('timestamp', 'timestamp', ''),
+    ('varchar2(50)', 'string', '50'), ('varchar2(200)', 'string', '200'), ('varchar2(16)', 'string', '16'),
+    ('varchar2(2)', 'string', '2'), ('number', 'numeric', ''), ('number(8)', 'numeric', '8'), ('date', 'string', '')
+]
+_MASTER_FIELDS_HEADER = ['application', 'schema', 'legacy_view', 'target_table', 'field_name', 'check_field_type',
+                         'field_type', 'field_length', 'primary_key']
+
+
+def build_master_fields(file_path: str, views: int, fields: int, seed: int = 1):
+    '''
+        Function to generate a synthetic master_fields.csv.
+        The views are split between the ruu and russ schemas, and only the first row of each
+        view has the application, schema, view and table cells, as in the real file.
+        Parameters:
+            file_path (str): Path of the master fields file
+            views (int): Number of legacy views
+            fields (int): Number of fields of each view
+            seed (int): Seed of the random generator
+        Returns:
+            list: (schema, legacy_view, fields) of each view, where fields are (name, check_field_type) tuples
+    '''
+    rnd = random.Random(seed)
+    view_list = []
+
+    with open(file_path, 'w', newline='') as fp:
+        writer = csv.writer(fp, delimiter=';')
+        writer.writerow(_MASTER_FIELDS_HEADER)
+        for view in range(views):
+            schema = 'ruu' if view % 2 == 0 else 'russ'
+            legacy_view = f'legado_vm_bench_{view:04d}'
+            field_list = []
+            for field in range(fields):
+                check_type, field_type, length = rnd.choice(_FIELD_TYPES)
+                name = f'campo_{field:04d}'
+                primary_key = 'Y' if field < 2 else ''
+                head = ['bench', schema, legacy_view, f'bench_{view:04d}'] if field == 0 else ['', '', '', '']
+                writer.writerow(head + [name, check_type, field_type, length, primary_key])
+                field_list.append((name, check_type))
+            view_list.append((schema, legacy_view, field_list))
+
+    return view_list
+
+
+def build_lineage_workbook(file_path: str, legacy: str, view_list: list, seed: int = 1, coverage: float = 0.85):
+    '''
+        Function to generate a synthetic lineage workbook with the two-level header of the real ones.
+        Every sheet has some extra columns before and after the lineage columns, and a share of
+        the master fields is left out of the lineage so the generators add them.
+        Parameters:
+            file_path (str): Path of the workbook
+            legacy (str): Legacy name, it replaces LEGADO in the view names
+            view_list (list): Views returned by build_master_fields
+            seed (int): Seed of the random generator
+            coverage (float): Share of the master fields present in the lineage
+    '''
+    rnd = random.Random(seed)
+    workbook = Workbook(write_only=True)
+
+    for schema, (sheet_name, legacy_header) in _SHEETS.items():
+        sheet = workbook.create_sheet(sheet_name)
+        groups = [(legacy_header, _LEGACY_COLUMNS)] + _COLUMN_GROUPS
+        top_header = ['Analista', None]
+        sub_header = ['Responsable', 'Nota']
+        for group, columns in groups:
+            for position, column in enumerate(columns):
+                top_header.append(group if position == 0 else None)
+                sub_header.append(column)
+        top_header += ['Extra', None]
+        sub_header += ['Estado', 'Fecha']
+        sheet.append(top_header)
+        sheet.append(sub_header)
+
+        for view_schema, legacy_view, field_list in view_list:
+            if view_schema != schema:
+                continue
+            view_name = legacy_view.upper().replace('LEGADO', legacy)
+            first = True
+            for name, check_type in field_list:
+                if rnd.random() > coverage:
+                    continue
+                field = name.upper()
+                landing_type = rnd.choice([check_type.upper(), check_type.upper(), None, 'NUMBER(10,2)', 'FLOAT(5)'])
+                staging_type = rnd.choice([check_type.upper(), None, 'VARCHAR2(20)'])
+                mandatory = rnd.choice(['S', 'N', None])
+                values = rnd.choice([None, None, '"A","B","C"', 'N/A', '1,2'])
+                sheet.append(
+                    ['bench', None]
+                    + [view_name if first else None, field, check_type.upper(), mandatory, None]
+                    + [field, landing_type, mandatory, None]
+                    + [field.lower(), staging_type, mandatory, None]
+                    + [values]
+                    + ['OK', rnd.randint(20200101, 20241231)]
+                )
+                first = False
+
+    workbook.save(file_path)
+
+
+def build_workspace(folder: str, legacy: str, views: int, fields: int, seed: int = 1):
+    '''
+        Function to generate the master fields and the lineage workbook of a benchmark run.
+        Parameters:
+            folder (str): Folder of the benchmark workspace
+            legacy (str): Legacy name
+            views (int): Number of legacy views
+            fields (int): Number of fields of each view
+            seed (int): Seed of the random generator
+        Returns:
+            tuple: Paths of the master fields file and of the lineage workbook
+    '''
+    os.makedirs(f'{folder}/cfg/params', exist_ok=True)
+    os.makedirs(f'{folder}/inputs/linajes', exist_ok=True)
+
+    master_fields_path = f'{folder}/cfg/params/master_fields.csv'
+    lineage_path = f'{folder}/inputs/linajes/HSU_{legacy}_Linaje_de_datos v1.0.xlsx'
+    view_list = build_master_fields(master_fields_path, views, fields, seed)
+    build_lineage_workbook(lineage_path, legacy, view_list, seed)
+
+    return master_fields_path, lineage_path
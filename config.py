@@ -1,4 +1,108 @@
 import configparser
+import os
+import threading
 
-config = configparser.ConfigParser()
-config.read('cfg/configs/config.cfg')
+# Folder of the program, the relative paths of the config are resolved from here
+BASE_FOLDER = os.path.dirname(os.path.abspath(__file__))
+_CONFIG_FILE = os.path.join(BASE_FOLDER, 'cfg', 'configs', 'config.cfg')
+
+
+class LazyConfigParser(configparser.ConfigParser):
+    '''
+        Config parser that reads its file the first time a value is requested, so importing the
+        modules of the program does not read anything.
+        The file is read under a lock, so the threads that ask for a value while it is being read
+        wait for it instead of getting a partial config.
+        It adds getpath to get the paths of the config as absolute paths, resolving the relative
+        ones from the base folder instead of the working directory.
+        Parameters:
+            file_path (str): Path of the config file
+            base_folder (str): Folder used to resolve the relative paths of the config
+    '''
+    def __init__(self, file_path: str, base_folder: str = BASE_FOLDER):
+        self.file_path = file_path
+        self.base_folder = base_folder
+        self._loaded = False
+        self._lock = threading.Lock()
+        super().__init__()
+
+    def use_file(self, file_path: str, base_folder: str = BASE_FOLDER):
+        '''
+            Function to change the config file, it is read again the next time a value is requested.
+            Parameters:
+                file_path (str): Path of the config file
+                base_folder (str): Folder used to resolve the relative paths of the config
+        '''
+        with self._lock:
+            for section in super().sections():
+                super().remove_section(section)
+            self.file_path = file_path
+            self.base_folder = base_folder
+            self._loaded = False
+
+    def load(self):
+        '''
+            Function to read the config file if it has not been read yet.
+        '''
+        if self._loaded:
+            return
+        with self._lock:
+            # Another thread may have read the file while this one was waiting
+            if not self._loaded:
+                self.read(self.file_path)
+                self._loaded = True
+
+    def getpath(self, section: str, option: str, fallback: str = None):
+        '''
+            Function to get a path of the config as an absolute path.
+            Parameters:
+                section (str): Config section
+                option (str): Config option
+                fallback (str): Path used if the option is not in the config
+            Returns:
+                str: Absolute path, keeping the trailing separator if the value has one
+        '''
+        value = self.get(section, option) if fallback is None else self.get(section, option, fallback=fallback)
+        path = os.path.expanduser(value)
+        if not os.path.isabs(path):
+            path = os.path.join(self.base_folder, path)
+        return path
+
+    def get(self, section, option, **kwargs):
+        self.load()
+        return super().get(section, option, **kwargs)
+
+    def sections(self):
+        self.load()
+        return super().sections()
+
+    def has_section(self, section):
+        self.load()
+        return super().has_section(section)
+
+    def has_option(self, section, option):
+        self.load()
+        return super().has_option(section, option)
+
+    def options(self, section):
+        self.load()
+        return super().options(section)
+
+    def items(self, *args, **kwargs):
+        self.load()
+        return super().items(*args, **kwargs)
+
+    def __getitem__(self, key):
+        self.load()
+        return super().__getitem__(key)
+
+    def __contains__(self, key):
+        self.load()
+        return super().__contains__(key)
+
+    def __iter__(self):
+        self.load()
+        return super().__iter__()
+
+
+config = LazyConfigParser(_CONFIG_FILE)
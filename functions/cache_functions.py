@@ -0,0 +1,176 @@
+import hashlib
+import os
+from collections import OrderedDict
+import pandas as pd
+from logger import logger
+from config import config
+
+_CACHE_EXTENSION = '.parquet'
+# Dataframes kept in memory by the long running modes, the least recently used first
+_MEMORY_CACHE = OrderedDict()
+_MEMORY_CACHE_ENTRIES = 0
+
+try:
+    import pyarrow  # noqa: F401
+    _PARQUET_AVAILABLE = True
+except ImportError:
+    _PARQUET_AVAILABLE = False
+
+
+def is_cache_active():
+    '''
+        Function to check if the parsed lineage cache can be used.
+        Returns:
+            bool: True if the cache is active in the config and a parquet engine is installed
+    '''
+    return _PARQUET_AVAILABLE and config.getboolean('cache', 'active', fallback=False)
+
+
+def get_file_hash(file_path: str):
+    '''
+        Function to calculate the content hash of a file.
+        Parameters:
+            file_path (str): Path to the file
+        Returns:
+            str: sha256 hex digest of the file content
+    '''
+    file_hash = hashlib.sha256()
+    with open(file_path, 'rb') as fp:
+        for chunk in iter(lambda: fp.read(1024 * 1024), b''):
+            file_hash.update(chunk)
+
+    return file_hash.hexdigest()
+
+
+def set_memory_cache_entries(entries: int):
+    '''
+        Function to keep the last used dataframes in memory, on top of the parquet cache. It is
+        used by the modes that process the same legacies again in the same process.
+        Parameters:
+            entries (int): Number of dataframes kept in memory, 0 to disable the memory cache
+    '''
+    global _MEMORY_CACHE_ENTRIES
+
+    _MEMORY_CACHE_ENTRIES = entries
+    _remember_dataframe(None, None)
+
+
+def get_cached_dataframe(key: str):
+    '''
+        Function to get a dataframe from the cache.
+        Parameters:
+            key (str): Cache key of the dataframe
+        Returns:
+            pd.DataFrame: Cached dataframe, or None if it is not in the cache
+    '''
+    if key in _MEMORY_CACHE:
+        _MEMORY_CACHE.move_to_end(key)
+        logger.debug(f'Memory cache hit for {key}')
+        # The callers modify the dataframe, the one in memory must stay as it was stored
+        return _MEMORY_CACHE[key].copy()
+
+    if not is_cache_active():
+        if not _PARQUET_AVAILABLE and config.getboolean('cache', 'active', fallback=False):
+            logger.warning('Lineage cache is active but pyarrow is not installed, cache disabled.')
+        return None
+
+    path = _get_cache_path(key)
+    if not os.path.exists(path):
+        logger.debug(f'Cache miss for {key}')
+        return None
+
+    try:
+        df = pd.read_parquet(path)
+    except Exception as err:
+        logger.warning(f'Error reading cache entry {key}, ignoring it: {err}')
+        return None
+
+    # Touch the entry so eviction removes the least recently used ones first
+    os.utime(path)
+    logger.debug(f'Cache hit for {key}')
+    _remember_dataframe(key, df)
+
+    return df
+
+
+def store_cached_dataframe(key: str, df: pd.DataFrame):
+    '''
+        Function to store a dataframe in the cache and evict old entries over the size limit.
+        Parameters:
+            key (str): Cache key of the dataframe
+            df (pd.DataFrame): Dataframe to store
+    '''
+    _remember_dataframe(key, df)
+    if not is_cache_active():
+        return
+
+    try:
+        os.makedirs(_get_cache_folder(), exist_ok=True)
+        path = _get_cache_path(key)
+        # Write to a temporary file first so concurrent runs never read a partial entry
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, path)
+        logger.debug(f'Stored cache entry {key}')
+        _evict_entries()
+    except Exception as err:
+        logger.warning(f'Error storing cache entry {key}: {err}')
+
+
+def _remember_dataframe(key: str, df: pd.DataFrame):
+    '''
+        Function to keep a copy of a dataframe in the memory cache, if it is enabled, and remove
+        the least recently used ones over the limit.
+        Parameters:
+            key (str): Cache key of the dataframe, None to only apply the limit
+            df (pd.DataFrame): Dataframe to keep
+    '''
+    if key is not None and _MEMORY_CACHE_ENTRIES > 0:
+        _MEMORY_CACHE[key] = df.copy()
+        _MEMORY_CACHE.move_to_end(key)
+    while len(_MEMORY_CACHE) > _MEMORY_CACHE_ENTRIES:
+        _MEMORY_CACHE.popitem(last=False)
+
+
+def _get_cache_folder():
+    '''
+        Function to get the folder of the cache.
+        Returns:
+            str: Absolute path of the cache folder
+    '''
+    return config.getpath('folders', 'lineage_cache_folder', fallback='cache/lineage')
+
+
+def _get_cache_path(key: str):
+    '''
+        Function to get the path of a cache entry.
+        Parameters:
+            key (str): Cache key
+        Returns:
+            str: Path of the cache entry
+    '''
+    return os.path.join(_get_cache_folder(), f'{key}{_CACHE_EXTENSION}')
+
+
+def _evict_entries():
+    '''
+        Function to remove the least recently used entries until the cache fits in its size limit.
+    '''
+    max_size = config.getint('cache', 'max_size_mb', fallback=512) * 1024 * 1024
+
+    entries = []
+    for item in os.scandir(_get_cache_folder()):
+        if item.is_file() and item.name.endswith(_CACHE_EXTENSION):
+            stat = item.stat()
+            entries.append((stat.st_mtime, stat.st_size, item.path))
+
+    total_size = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total_size <= max_size:
+            break
+        logger.debug(f'Evicting cache entry {path}')
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total_size -= size
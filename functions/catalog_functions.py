@@ -0,0 +1,77 @@
+import os
+import pandas as pd
+from logger import logger
+from config import config
+
+_CATALOG = None
+
+
+class MasterFieldCatalog:
+    '''
+        In-memory catalog with the normalized content of master_fields.csv.
+        The file is read and normalized once, and its rows are indexed by schema. The returned
+        dataframes are shallow views over the catalog data: the caller can add or replace columns,
+        but must not modify the cells in place.
+        Parameters:
+            file_path (str): Path to the master fields file.
+    '''
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        self.mtime = os.path.getmtime(file_path)
+
+        logger.debug(f'Loading master fields catalog from {file_path}')
+        fields_df = _load_master_fields(file_path)
+
+        self._schemas = {
+            schema: schema_df.reset_index(drop=True)
+            for schema, schema_df in fields_df.groupby('SCHEMA', sort=False)
+        }
+
+        self.columns = fields_df.columns
+
+    def get_schema(self, schema: str):
+        '''
+            Function to get all fields of a schema.
+            Parameters:
+                schema (str): Schema name
+            Returns:
+                pd.DataFrame: Dataframe with all fields for the schema
+        '''
+        schema_df = self._schemas.get(schema.upper())
+        if schema_df is None:
+            return pd.DataFrame(columns=self.columns)
+        return schema_df.copy(deep=False)
+
+
+def get_master_field_catalog():
+    '''
+        Function to get the master fields catalog, loading it only the first time or when
+        the file has been modified.
+        Returns:
+            MasterFieldCatalog: Catalog with the master fields
+    '''
+    global _CATALOG
+
+    file_path = config.getpath('folders', 'parameter_file_folder')
+    if _CATALOG is None or _CATALOG.file_path != file_path or _CATALOG.mtime != os.path.getmtime(file_path):
+        _CATALOG = MasterFieldCatalog(file_path)
+
+    return _CATALOG
+
+
+def _load_master_fields(file_path: str):
+    '''
+        Function to read and normalize the master fields file.
+        Parameters:
+            file_path (str): Path to the master fields file
+        Returns:
+            pd.DataFrame: Dataframe with uppercase columns and values, and the grouping cells filled
+    '''
+    fields_df = pd.read_csv(file_path, sep=';', dtype=str, header=0)
+    fields_df.columns = map(str.upper, fields_df.columns)
+    fields_df = fields_df.apply(lambda column: column.str.upper())
+    fields_df['PRIMARY_KEY'] = fields_df['PRIMARY_KEY'].fillna('N')
+    fields_df['FIELD_LENGTH'] = fields_df['FIELD_LENGTH'].fillna(0)
+    fields_df.ffill(inplace=True)
+
+    return fields_df
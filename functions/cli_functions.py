@@ -0,0 +1,103 @@
+import argparse
+import sys
+from config import config
+
+# This module is imported before anything else, keep it free of heavy imports (pandas, openpyxl)
+_LEGACIES = ['APET','APMV','AYMV','BDUC','GTFN','HSSR','PISO','PNC','RGM','RMIN','SIDM','SIMP','SOIC']
+
+
+# Validation parameters function
+def validate_parameters(argv: list = None):
+    '''
+        Auxiliar function to validate parameters
+        Parameters:
+            argv (list): Arguments to parse, by default the ones of the command line
+        Returns:
+            args: input parameters
+    '''
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] in _COMMANDS:
+        args = _COMMANDS[argv[0]]().parse_args(argv[1:])
+        args.command = argv[0]
+        if 'legado' in args:
+            args.legado = _get_legacies(args)
+        return args
+
+    parser = argparse.ArgumentParser(epilog=f'Other commands: {", ".join(_COMMANDS)}, see main.py <command> --help')
+    legacy_group = parser.add_mutually_exclusive_group(required=True)
+    legacy_group.add_argument('--legado', type=str, nargs='+', choices=_LEGACIES)
+    legacy_group.add_argument('--all', action='store_true', help='Process all the available legacies')
+    parser.add_argument('--workers', type=int,
+                        help='Number of processes used to run the legacies in parallel, by default the one in the config')
+    parser.add_argument('--profile', action='store_true',
+                        help='Measure the time and memory of each stage and save a JSON report per legacy')
+    parser.add_argument('--cprofile', action='store_true', help='Also save a cProfile dump per legacy, implies --profile')
+    parser.add_argument('--watch', action='store_true',
+                        help='Keep running and generate a legacy again every time a new version of its lineage lands')
+    parser.add_argument('--interval', type=float,
+                        help='Seconds between two checks of the lineage folder in watch mode, by default the one in the config')
+    args = parser.parse_args(argv)
+
+    args.legado = _get_legacies(args)
+    if args.workers is None:
+        # Read the config only once the arguments are valid
+        args.workers = config.getint('batch', 'workers', fallback=1)
+    if args.workers < 1:
+        parser.error('--workers must be greater than 0')
+    args.profile = args.profile or args.cprofile
+    if args.interval is None:
+        args.interval = config.getfloat('watch', 'interval', fallback=5)
+    if args.interval <= 0:
+        parser.error('--interval must be greater than 0')
+    args.command = 'generate'
+
+    return args
+
+
+def _get_evaluate_parser():
+    '''
+        Auxiliar function to build the parser of the evaluate command
+        Returns:
+            ArgumentParser: Parser of the evaluate parameters
+    '''
+    parser = argparse.ArgumentParser(prog='main.py evaluate',
+                                     description='Evaluate a data quality ruleset against an extract of the table')
+    parser.add_argument('--ruleset', required=True, help='Ruleset file written by the data quality generator')
+    parser.add_argument('--data', required=True, help='CSV or parquet extract of the staging table')
+    parser.add_argument('--sep', default=',', help='Separator of the CSV extracts, by default ,')
+    parser.add_argument('--report', help='Save the result of each rule in a JSON file')
+    return parser
+
+
+def _get_convert_parser():
+    '''
+        Auxiliar function to build the parser of the convert command
+        Returns:
+            ArgumentParser: Parser of the convert parameters
+    '''
+    parser = argparse.ArgumentParser(prog='main.py convert',
+                                     description='Convert the last lineage excel of each legacy to parquet files, '
+                                                 'which the generation reads instead of the excel')
+    legacy_group = parser.add_mutually_exclusive_group(required=True)
+    legacy_group.add_argument('--legado', type=str, nargs='+', choices=_LEGACIES)
+    legacy_group.add_argument('--all', action='store_true', help='Convert all the available legacies')
+    parser.add_argument('--force', action='store_true', help='Convert the lineages again even if they are up to date')
+    return parser
+
+
+def _get_legacies(args):
+    '''
+        Auxiliar function to normalize the legacy list, keeping the input order without duplicates
+        Parameters:
+            args: input parameters with the legado and all options
+        Returns:
+            list: legacy names
+    '''
+    return _LEGACIES if args.all else list(dict.fromkeys(args.legado))
+
+
+# Commands besides the generation of the legacies, python main.py <command> ...
+_COMMANDS = {
+    'evaluate': _get_evaluate_parser,
+    'convert': _get_convert_parser
+}
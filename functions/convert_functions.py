@@ -0,0 +1,32 @@
+import os
+from logger import logger
+from functions.generic_functions import find_last_lineage_file, is_lineage_converted, convert_lineage
+
+
+def run_conversion(legacies: list, force: bool = False):
+    '''
+        Function to convert the last lineage excel of some legacies to parquet, one file per schema
+        next to the excel. The lineages already converted, and not modified since, are skipped.
+        Parameters:
+            legacies (list): Legacy names
+            force (bool): True to convert the lineages again even if they are up to date
+        Returns:
+            bool: True if every lineage found was converted or was up to date
+    '''
+    valid = True
+    for legacy in legacies:
+        lineage_path = find_last_lineage_file(legacy)
+        if lineage_path is None:
+            logger.warning(f'No lineage found for {legacy}, nothing to convert')
+            continue
+        if not force and is_lineage_converted(lineage_path):
+            logger.info(f'{os.path.basename(lineage_path)} is already converted')
+            continue
+
+        try:
+            convert_lineage(lineage_path)
+        except Exception as err:
+            logger.error(f'Error converting {os.path.basename(lineage_path)}: {err}')
+            valid = False
+
+    return valid
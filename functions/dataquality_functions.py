@@ -1,114 +1,132 @@
 import pandas as pd
 from config import config
 from logger import logger
-from functions.generic_functions import create_folder
+from functions.partition_functions import LineageProjection, join_lineage
+from functions.output_functions import LegacyOutput
+from functions.manifest_functions import get_table_key, get_fingerprint, is_unchanged, create_entry
+from functions.dqdl_functions import DqRule, parse_values, render_rulesets
 
-_OUTPUT_FOLDER = config['folders']['dataquality_output_folder']
+# Config values used to generate the rules, a change in any of them generates the tables again
+_FINGERPRINT_CONFIG = [('dataquality', 'is_complete'), ('dataquality', 'environments'), ('dataquality', 'database')]
 
-def generate_dataquality(df: pd.DataFrame, config_df: pd.DataFrame, legacy: str, schema: str):
+def generate_dataquality(lineage: LineageProjection, partitions: list, legacy: str, schema: str, manifest: dict,
+                         output: LegacyOutput):
     """
     Generate data quality checks based on the provided dataframes and legacy system information.
 
     Parameters:
-        df (pd.DataFrame): The main DataFrame containing data for data quality checks.
-        config_df (pd.DataFrame): Configuration DataFrame with legacy view and field names.
+        lineage (LineageProjection): Read-only projection of the lineage with the legacy fields and their values.
+        partitions (list): List of TablePartition with the configuration and lineage join of each table.
         legacy (str): The legacy system identifier used in the naming conventions.
+        schema (str): The schema of the tables.
+        manifest (dict): Tables of the previous manifest of the legacy, the unchanged tables are skipped.
+        output (LegacyOutput): Staged outputs of the legacy.
+
+    Returns:
+        dict: Manifest entries of the tables of the schema.
 
     The function processes the configuration and main DataFrames to produce data quality
     checks as CSV files, applying transformations and filtering based on defined rules.
     """
     logger.info('Generating data quality checks.')
     
-    # Create legacy output folder
-    create_folder(f'{_OUTPUT_FOLDER}/{legacy}')
-    
-    # Formalice config dataframe for join
-    config_df['LEGACY_VIEW'] = config_df['LEGACY_VIEW'].str.replace('LEGADO', legacy.upper())
+    entries = {}
+    for partition in partitions:
+        logger.debug(f'Checking {partition.lineage_view}')
 
-    # Join config and lineaje dataframe
-    join_df = pd.merge(config_df, df, left_on=['LEGACY_VIEW', 'FIELD_NAME'],
-                       right_on=['LEGACY_NOMBRE_VISTA','LEGACY_NOMBRE_CAMPO'], how='left')
-    
-    # Add column to process
-    join_df['EXISTS'] = join_df['LEGACY_NOMBRE_CAMPO'].notna()
+        # Join config and lineaje of the table by legacy field name
+        join_df_filtered = join_lineage(partition.config_df, lineage, partition.legacy_join)
 
-    legacy_tables = config_df['LEGACY_VIEW'].unique().tolist()
-    for legacy_table in legacy_tables:
-        logger.debug(f'Checking {legacy_table}')
+        key = get_table_key('dataquality', schema, partition.legacy_view)
+        fingerprint = get_fingerprint(join_df_filtered, _FINGERPRINT_CONFIG)
+        if is_unchanged(manifest, key, fingerprint, output, 'dataquality'):
+            logger.debug(f'Skipping data quality for {partition.lineage_view}, inputs unchanged')
+            output.keep('dataquality', manifest[key]['files'])
+            entries[key] = manifest[key]
+            continue
+
+        # Add column to process
+        join_df_filtered['EXISTS'] = join_df_filtered['LEGACY_NOMBRE_CAMPO'].notna()
 
-        # Filter dataframe to process table by table
-        join_df_filtered = join_df[join_df['LEGACY_VIEW'] == legacy_table].reset_index(drop=True)
-        target_table = join_df_filtered['TARGET_TABLE'].unique()[0]
-        
         # Generate rules
-        rules = _generate_dataquality_rules(join_df_filtered, target_table)
+        rules = _generate_dataquality_rules(join_df_filtered, partition.target_table)
 
         # Generate files by environment
-        _generate_dataquality_files(rules, target_table, legacy)
+        files = _generate_dataquality_files(rules, partition.target_table, output)
+        entries[key] = create_entry(fingerprint, files)
+
+    return entries
 
 
 def _generate_dataquality_rules(df: pd.DataFrame, table: str):
     """
         This function analyzes a DataFrame containing metadata about database columns
-        and constructs a set of data quality validation rules represented as a string.
+        and constructs the data quality validation rules of the table.
 
         Parameters:
             df (pd.DataFrame): A DataFrame containing metadata.
             table (str): The name of the database table for which to generate the rules.
 
         Returns:
-            str: A string quality rules.
+            list: DqRule of the table, without duplicates and in the order of the ruleset.
     """
     column_exists_list =  df.loc[df['EXISTS'] == True, 'FIELD_NAME'].tolist()
     is_complete_list = []
     if config.getboolean('dataquality', 'is_complete', fallback=False):
         is_complete_list = df.loc[df['EXISTS'] == False, 'FIELD_NAME'].tolist()
     column_value_list = df.dropna(subset=['VALORES_FORMATEADOS'])
-    column_value_list = column_value_list[~column_value_list['VALORES_FORMATEADOS'].str.contains("N/A", na=False)][['FIELD_NAME', 'VALORES_FORMATEADOS']].values
+    column_value_list = column_value_list[~column_value_list['VALORES_FORMATEADOS'].astype(str).str.contains("N/A", na=False)][['FIELD_NAME', 'VALORES_FORMATEADOS']].values
     is_unique_list = df.loc[df['PRIMARY_KEY'] == 'Y', 'FIELD_NAME'].tolist()
     column_length_list = df[df['FIELD_LENGTH'] != 0][['FIELD_NAME', 'FIELD_LENGTH']].values
 
     rule_list = []
 
-    # Add first rule
-    rule_list.append(f'SchemaMatch "{config.get("dataquality","database")}.{table.lower()}"= 1.0')
-    
-    # Add schema match rule for the table
-    rule_list.append(f'SchemaMatch "{config.get("dataquality", "database")}.{table.lower()}"= 1.0')
+    # Add schema match rule for the table, the database is added for each environment
+    rule_list.append(DqRule('SchemaMatch', table.lower(), '=', 1.0))
 
     # Add existence rules
-    rule_list.extend([f'ColumnExists "{col}"' for col in column_exists_list])
+    rule_list.extend([DqRule('ColumnExists', col, None, None) for col in column_exists_list])
 
     # Add completeness rules
-    rule_list.extend([f'IsComplete "{col}"' for col in is_complete_list])
+    rule_list.extend([DqRule('IsComplete', col, None, None) for col in is_complete_list])
 
     # Add column values rules
-    rule_list.extend([f'ColumnValues "{col}" in [{values}]' for col, values in column_value_list])
+    rule_list.extend([DqRule('ColumnValues', col, 'in', parse_values(str(values))) for col, values in column_value_list])
 
     # Add uniqueness rules
-    rule_list.extend([f'IsUnique "{col}"' for col in is_unique_list])
+    rule_list.extend([DqRule('IsUnique', col, None, None) for col in is_unique_list])
 
     # Add length rules
-    rule_list.extend([f'ColumnLength "{col}" <= {float(length)}' for col, length in column_length_list])
+    rule_list.extend([DqRule('ColumnLength', col, '<=', float(length)) for col, length in column_length_list])
 
-    # Join rules into a single string
-    rules = f'Rules = [{", ".join(rule_list)}]'
-    
-    return rules
+    # Remove the repeated rules, keeping the first one
+    return list(dict.fromkeys(rule_list))
 
 
-def _generate_dataquality_files(rules: str, table: str, legacy: str):
+def _generate_dataquality_files(rules: list, table: str, output: LegacyOutput):
     """
         Generates data quality files based on the specified rules and saves them to a designated path.
+        The environment is only written in the database of the SchemaMatch rules, and the files
+        with the same content are written once and linked.
 
         Parameters:
-            rules (str): The data quality rules to be written into the files.
+            rules (list): DqRule of the table.
             table (str): The name of the database table associated with the rules.
-            legacy (str): A legacy identifier used to structure the output folder path.
-    """
-    path = f'{_OUTPUT_FOLDER}/{legacy}/ruleset_01_stg_{table}'
-    create_folder(path)
+            output (LegacyOutput): Staged outputs of the legacy, where the files are written.
 
-    for env in config.get('dataquality', 'environments').split(','):
-        with open(f'{path}/value-{env}.txt', 'w') as f:
-            f.write(rules.replace('environment', env))
\ No newline at end of file
+        Returns:
+            list: Paths of the files written, relative to the legacy folder.
+    """
+    folder = f'ruleset_01_stg_{table}'
+    environments = config.get('dataquality', 'environments').split(',')
+    database = config.get('dataquality', 'database')
+    rulesets = render_rulesets(rules, [database.replace('environment', env) for env in environments])
+
+    # Files of each distinct ruleset, in the order of the environments
+    copies = {}
+    for env, ruleset in zip(environments, rulesets):
+        copies.setdefault(ruleset, []).append(f'{folder}/value-{env}.txt')
+    for ruleset, files in copies.items():
+        output.write_copies('dataquality', files, ruleset)
+
+    return [f'{folder}/value-{env}.txt' for env in environments]
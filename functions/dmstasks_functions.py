@@ -1,94 +1,147 @@
 import json
 import pandas as pd
-import copy
 from logger import logger
 from config import config
+from functions.output_functions import LegacyOutput
+from functions.manifest_functions import get_table_key, get_fingerprint, is_unchanged, create_entry
 
 
-_OUTPUT_FOLDER = config['Folders']['dmstask_output_folder']
-_GENERIC_RULE = {
-    "rule-type": "transformation",
-    "rule-id": "value",
-    "rule-name": "value",
-    "rule-target": "column",
-    "object-locator": {
-        "schema-name": "schema_name",
-        "table-name": "table_name",
-        "column-name": "column_name"
-    },
-    "rule-action": "action",
-    "value": None,
-    "old-value": None,
-    "expression":"",
-    "data-type":{
-        "type":"type",
-        "length": 1,
-        "precision": 1,
-        "scale": 1
-    }
-}
+_SCHEMA_NAME = "nombre_schema"
+_TIMESTAMP_DATA_TYPE = {"type": "string", "length": 14}
+_JSON_MODES = ('pretty', 'compact')
+# Config values that change the content of the files, a change in any of them generates the tables again
+_FINGERPRINT_CONFIG = [('dmstask', 'json_mode'), ('dmstask', 'json_backend')]
+# Indentation of the rules inside the pretty printed {"rules": [...]} document
+_PRETTY_RULE_INDENT = ' ' * 8
+
+try:
+    import orjson
+    _ORJSON_AVAILABLE = True
+except ImportError:
+    _ORJSON_AVAILABLE = False
 
 
-def generate_dmstask(df: pd.DataFrame, config_df: pd.DataFrame, legacy: str, schema: str):
+def generate_dmstask(partitions: list, legacy: str, schema: str, manifest: dict, output: LegacyOutput):
     '''
         Function to generate and save dmstask json file for table.
         Parameters:
-            df (pd.DataFrame): DataFrame with the lineage information
-            config_df (pd.DataFrame): DataFrame with the configuration information
+            partitions (list): List of TablePartition with the configuration and lineage join of each table
             legacy (str): Legacy name
             schema (str): Schema name
+            manifest (dict): Tables of the previous manifest of the legacy, the unchanged tables are skipped
+            output (LegacyOutput): Staged outputs of the legacy
+        Returns:
+            dict: Manifest entries of the tables of the schema
     '''
+    json_mode = config.get('dmstask', 'json_mode', fallback='pretty').lower()
+    encode_rule = _get_rule_encoder(json_mode)
+    entries = {}
     # Recorrer el dataframe config y compararlo con el df del linaje
-    legacy_tables = config_df['LEGACY_VIEW'].unique().tolist()
-    for legacy_table in legacy_tables:
-        logger.debug(f'Checking {legacy_table}')
+    for partition in partitions:
+        logger.debug(f'Checking {partition.legacy_view}')
 
-        config_df_filtered = config_df[config_df['LEGACY_VIEW'] == legacy_table].reset_index(drop=True)
-        df_filtered = df[df['LEGACY_NOMBRE_VISTA'] == legacy_table.replace('LEGADO',legacy.upper())].reset_index(drop=True)
+        config_df_filtered = partition.config_df.assign(PRESENT_IN_LINEAGE=partition.present_in_lineage)
 
-        target_table = config_df_filtered['TARGET_TABLE'].unique()[0]
+        key = get_table_key('dmstask', schema, partition.legacy_view)
+        fingerprint = get_fingerprint(config_df_filtered, _FINGERPRINT_CONFIG)
+        if is_unchanged(manifest, key, fingerprint, output, 'dmstask'):
+            logger.debug(f'Skipping dmstask for {partition.legacy_view}, inputs unchanged')
+            output.keep('dmstask', manifest[key]['files'])
+            entries[key] = manifest[key]
+            continue
 
-        config_df_filtered['PRESENT_IN_LINEAGE'] = config_df_filtered['FIELD_NAME'].isin(df_filtered['LEGACY_NOMBRE_CAMPO'])
-    
-        rules = _generate_file(config_df_filtered)
+        rules = _generate_rules(config_df_filtered)
 
-        with open(f'{_OUTPUT_FOLDER}/{legacy.lower()}/{target_table.lower()}_{legacy.lower()}.json', 'w') as fp:
-            json.dump(rules, fp, indent=4)
+        file = f'{partition.target_table.lower()}_{legacy.lower()}.json'
+        with output.open('dmstask', file) as fp:
+            _write_rules(fp, rules, json_mode, encode_rule)
+        entries[key] = create_entry(fingerprint, [file])
 
+    return entries
 
-def _generate_file(df: pd.DataFrame):
+
+def _generate_rules(df: pd.DataFrame):
     '''
-        Function to generate the dmstask rules.
+        Function to generate the dmstask rules, one by one so they can be written as they are built.
         Parameters:
             df (pd.DataFrame): DataFrame with the configuration information fields
         Returns:
-            list: List of rules for dmstask
+            generator: Rules for dmstask, in the order of the file
     '''
     logger.info(f'Generating dmstask for {df["LEGACY_VIEW"].unique()[0]}')
-    # Defines
-    rule_list = []
 
     # needed vars
     legacy_table = df['LEGACY_VIEW'].unique()[0]
     target_table = df['TARGET_TABLE'].unique()[0]
 
     # Construct dmstask
-    rule_list.append(_get_schema_rule())
-    rule_list.append(_get_table_rule(legacy_table, target_table.lower()))
+    yield _get_schema_rule()
+    yield _get_table_rule(legacy_table, target_table.lower())
 
+    # Field rules, built from the columns of the config dataframe
+    fields = zip(df['FIELD_NAME'], df['PRESENT_IN_LINEAGE'], df['FIELD_TYPE'], df['FIELD_LENGTH'])
     counter_rule = 2
-    for index, row in df.iterrows():
-        dict_row = row.to_dict()
-        rule_list.append(_get_field_rule(dict_row, legacy_table, counter_rule))
+    for field_name, present_in_lineage, field_type, field_length in fields:
+        if present_in_lineage:
+            yield _get_include_column_rule(field_name, legacy_table, counter_rule)
+        else:
+            yield _get_add_column_rule(field_name, field_type, field_length, legacy_table, counter_rule)
         counter_rule += 1
 
-    rule_list.append(_get_timestamp_carga_rule(legacy_table, counter_rule))
+    yield _get_timestamp_carga_rule(legacy_table, counter_rule)
     counter_rule += 1
-    rule_list.append(_get_filter_rule(legacy_table, counter_rule))
+    yield _get_filter_rule(legacy_table, counter_rule)
 
-    dict_rules = {"rules": rule_list}
 
-    return dict_rules
+def _write_rules(fp, rules, json_mode: str, encode_rule):
+    '''
+        Function to write the {"rules": [...]} document rule by rule, without building it in memory.
+        The pretty mode writes the same text as json.dump with indent=4.
+        Parameters:
+            fp (file): File opened for writing
+            rules (iterable): Rules for dmstask
+            json_mode (str): pretty or compact
+            encode_rule (callable): Function to serialize a rule, from _get_rule_encoder
+    '''
+    if json_mode == 'pretty':
+        start, separator, end = '{\n    "rules": [\n', ',\n', '\n    ]\n}'
+    else:
+        start, separator, end = '{"rules":[', ',', ']}'
+
+    fp.write(start)
+    for position, rule in enumerate(rules):
+        if position:
+            fp.write(separator)
+        fp.write(encode_rule(rule))
+    fp.write(end)
+
+
+def _get_rule_encoder(json_mode: str):
+    '''
+        Function to get the function that serializes a rule for the output mode.
+        The compact mode uses orjson if the backend allows it and it is installed, the pretty mode
+        always uses the standard library to keep the format of the files.
+        Parameters:
+            json_mode (str): pretty or compact
+        Returns:
+            callable: Function that returns the text of a rule
+        Exceptions:
+            ValueError: Raised if the mode or the backend are not valid
+    '''
+    if json_mode not in _JSON_MODES:
+        raise ValueError(f'Invalid dmstask json_mode {json_mode}, it must be one of {", ".join(_JSON_MODES)}')
+
+    backend = config.get('dmstask', 'json_backend', fallback='auto').lower()
+    if backend not in ('auto', 'json', 'orjson'):
+        raise ValueError(f'Invalid dmstask json_backend {backend}, it must be auto, json or orjson')
+    if backend == 'orjson' and not _ORJSON_AVAILABLE:
+        logger.warning('dmstask json_backend is orjson but it is not installed, using json.')
+
+    if json_mode == 'pretty':
+        return lambda rule: _PRETTY_RULE_INDENT + json.dumps(rule, indent=4).replace('\n', '\n' + _PRETTY_RULE_INDENT)
+    if backend != 'json' and _ORJSON_AVAILABLE:
+        return lambda rule: orjson.dumps(rule).decode()
+    return lambda rule: json.dumps(rule, separators=(',', ':'))
 
 
 # Function to generate rules
@@ -98,23 +151,18 @@ def _get_schema_rule():
         Returns:
             dict: Schema rule for dmstask
     '''
-    rule = copy.deepcopy(_GENERIC_RULE)
-
-    # modify values
-    rule["rule-id"] = "0"
-    rule["rule-name"] = "0"
-    rule["rule-target"] = "schema"
-    rule["object-locator"]["schema-name"] = "nombre_schema"
-    rule["rule-action"] = "rename"
-    rule["value"] = "carnet"
-
-    # delete non used keys
-    del rule["object-locator"]["table-name"]
-    del rule["object-locator"]["column-name"]
-    del rule["expression"]
-    del rule["data-type"]
-
-    return rule
+    return {
+        "rule-type": "transformation",
+        "rule-id": "0",
+        "rule-name": "0",
+        "rule-target": "schema",
+        "object-locator": {
+            "schema-name": _SCHEMA_NAME
+        },
+        "rule-action": "rename",
+        "value": "carnet",
+        "old-value": None
+    }
 
 
 def _get_table_rule(legacy_table: str, target_table: str):
@@ -126,71 +174,84 @@ def _get_table_rule(legacy_table: str, target_table: str):
         Returns:
             dict: Schema rule for dmstask
     '''
-    rule = copy.deepcopy(_GENERIC_RULE)
-
-    # modify values
-    rule["rule-id"] = "1"
-    rule["rule-name"] = "1"
-    rule["rule-target"] = "table"
-    rule["object-locator"]["schema-name"] = "nombre_schema"
-    rule["object-locator"]["table-name"] = legacy_table
-    rule["rule-action"] = "rename"
-    rule["value"] = target_table
+    return {
+        "rule-type": "transformation",
+        "rule-id": "1",
+        "rule-name": "1",
+        "rule-target": "table",
+        "object-locator": {
+            "schema-name": _SCHEMA_NAME,
+            "table-name": legacy_table
+        },
+        "rule-action": "rename",
+        "value": target_table,
+        "old-value": None
+    }
 
-    # delete non used keys
-    del rule["object-locator"]["column-name"]
-    del rule["expression"]
-    del rule["data-type"]
 
-    return rule
+def _get_include_column_rule(field_name: str, legacy_table: str, index: int):
+    '''
+        Function to create the rule for a field present in the lineage.
+        Parameters:
+            field_name (str): Field name
+            legacy_table (str): Legacy table name
+            index (int): Index for the rule
+        Return:
+            dict: Field rule for dmstask
+    '''
+    return {
+        "rule-type": "transformation",
+        "rule-id": str(index),
+        "rule-name": str(index),
+        "rule-target": "column",
+        "object-locator": {
+            "schema-name": _SCHEMA_NAME,
+            "table-name": legacy_table,
+            "column-name": field_name
+        },
+        "rule-action": "include-column",
+        "value": None,
+        "old-value": None
+    }
 
 
-def _get_field_rule(row: dict, legacy_table: str, index: int):
+def _get_add_column_rule(field_name: str, field_type: str, field_length, legacy_table: str, index: int):
     '''
-        Function to create field rules.
+        Function to create the rule for a field missing in the lineage, adding it as a new column.
         Parameters:
-            row (dict): Dictionary with the field information
+            field_name (str): Field name
+            field_type (str): Field type (STRING, NUMERIC or TIMESTAMP)
+            field_length: Field length, or precision and scale separated by comma for numeric fields
             legacy_table (str): Legacy table name
             index (int): Index for the rule
         Return:
             dict: Field rule for dmstask
     '''
-    rule = copy.deepcopy(_GENERIC_RULE)
-
-    # modify values
-    rule["rule-id"] = str(index)
-    rule["rule-name"] = str(index)
-    rule["rule-target"] = "column"
-    rule["object-locator"]["schema-name"] = "nombre_schema"
-    rule["object-locator"]["table-name"] = legacy_table
-
-    if row.get('PRESENT_IN_LINEAGE'):
-        rule["object-locator"]["column-name"] = row.get('FIELD_NAME')
-        rule["rule-action"] = "include-column"
-        del rule["expression"]
-        del rule["data-type"]
-    else:
-        rule["rule-action"] = "add-column"
-        rule["value"] = row.get('FIELD_NAME')
-        del rule["object-locator"]["column-name"]
-        del rule["old-value"]
-        if row.get('FIELD_TYPE') == 'STRING':
-            rule["data-type"]["type"] = row.get('FIELD_TYPE').lower()
-            rule["data-type"]["length"] = int(row.get('FIELD_LENGTH'))
-            del rule["data-type"]['precision']
-            del rule["data-type"]['scale']
-        elif row.get('FIELD_TYPE') == 'NUMERIC':
-            rule["data-type"]["type"] = row.get('FIELD_TYPE').lower()
-            rule["data-type"]["precision"] = _extract_precission_scale(row.get('FIELD_LENGTH'), 0)
-            rule["data-type"]["scale"] = _extract_precission_scale(row.get('FIELD_LENGTH'), 1)
-            del rule["data-type"]['length']
-        else: # row.get('DATA_TYPE') == 'TIMESTAMP':
-            rule["data-type"]["type"] = 'string'
-            rule["data-type"]["length"] = 14
-            del rule["data-type"]['precision']
-            del rule["data-type"]['scale']
-
-    return rule
+    if field_type == 'STRING':
+        data_type = {"type": field_type.lower(), "length": int(field_length)}
+    elif field_type == 'NUMERIC':
+        data_type = {
+            "type": field_type.lower(),
+            "precision": _extract_precission_scale(field_length, 0),
+            "scale": _extract_precission_scale(field_length, 1)
+        }
+    else: # field_type == 'TIMESTAMP':
+        data_type = dict(_TIMESTAMP_DATA_TYPE)
+
+    return {
+        "rule-type": "transformation",
+        "rule-id": str(index),
+        "rule-name": str(index),
+        "rule-target": "column",
+        "object-locator": {
+            "schema-name": _SCHEMA_NAME,
+            "table-name": legacy_table
+        },
+        "rule-action": "add-column",
+        "value": field_name,
+        "expression": "",
+        "data-type": data_type
+    }
 
 
 def _get_timestamp_carga_rule(legacy_table: str, index: int):
@@ -202,27 +263,20 @@ def _get_timestamp_carga_rule(legacy_table: str, index: int):
         Return:
             dict: Field rule for dmstask
     '''
-    rule = copy.deepcopy(_GENERIC_RULE)
-
-    # modify values
-    rule["rule-id"] = str(index)
-    rule["rule-name"] = str(index)
-    rule["rule-target"] = "column"
-    rule["object-locator"]["schema-name"] = "nombre_schema"
-    rule["object-locator"]["table-name"] = legacy_table
-    rule["rule-action"] = "add-column"
-    rule["value"] = "TIMESTAMP_CARGA"
-    rule["expression"] = "{{timestamp_carga}}"
-    rule["data-type"]["type"] = "string"
-    rule["data-type"]["length"] = 14
-
-    # delete non used keys
-    del rule["object-locator"]["column-name"]
-    del rule["old-value"]
-    del rule["data-type"]["precision"]
-    del rule["data-type"]["scale"]
-
-    return rule
+    return {
+        "rule-type": "transformation",
+        "rule-id": str(index),
+        "rule-name": str(index),
+        "rule-target": "column",
+        "object-locator": {
+            "schema-name": _SCHEMA_NAME,
+            "table-name": legacy_table
+        },
+        "rule-action": "add-column",
+        "value": "TIMESTAMP_CARGA",
+        "expression": "{{timestamp_carga}}",
+        "data-type": dict(_TIMESTAMP_DATA_TYPE)
+    }
 
 
 def _get_filter_rule(legacy_table: str, index: int):
@@ -234,37 +288,28 @@ def _get_filter_rule(legacy_table: str, index: int):
         Return:
             dict: Field rule for dmstask
     '''
-    rule = copy.deepcopy(_GENERIC_RULE)
-
-    # modify values
-    rule["rule-type"] = "selection"
-    rule["rule-id"] = str(index)
-    rule["rule-name"] = str(index)
-    rule["object-locator"]["schema-name"] = "nombre_schema"
-    rule["object-locator"]["table-name"] = legacy_table
-    rule["rule-action"] = "include"
-    rule["filters"] = [
-        {
-            "filter-type": "source",
-            "column-name": "FC_ULTIMA_ACT",
-            "filter-conditions": [
-                {
-                    "filter-operator": "gte",
-                    "value": "{{lastExecution}}"
-                }
-            ]
-        }
-    ]
-
-    # delete non used keys
-    del rule["object-locator"]["column-name"]
-    del rule["value"]
-    del rule["expression"]
-    del rule["data-type"]
-    del rule["old-value"]
-    del rule["rule-target"]
-
-    return rule
+    return {
+        "rule-type": "selection",
+        "rule-id": str(index),
+        "rule-name": str(index),
+        "object-locator": {
+            "schema-name": _SCHEMA_NAME,
+            "table-name": legacy_table
+        },
+        "rule-action": "include",
+        "filters": [
+            {
+                "filter-type": "source",
+                "column-name": "FC_ULTIMA_ACT",
+                "filter-conditions": [
+                    {
+                        "filter-operator": "gte",
+                        "value": "{{lastExecution}}"
+                    }
+                ]
+            }
+        ]
+    }
 
 
 def _extract_precission_scale(length_field: str, index: int):
@@ -0,0 +1,540 @@
+import json
+import os
+import re
+import time
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+from logger import logger
+
+DqRule = namedtuple('DqRule', [
+    'rule_type',  # DQDL rule type (ColumnExists, IsComplete, ...)
+    'target',     # Column, or database.table for SchemaMatch
+    'operator',   # Comparison operator (=, <=, in, ...), None if the rule has no expression
+    'value'       # Number compared with the operator, or tuple of values for in
+])
+
+
+class DqNumber(str):
+    '''
+        Number of a list of values of a rule, kept as it is written so it is rendered the same
+        way and can also be compared with text columns (01 is not 1).
+    '''
+
+
+class DqUnquoted(str):
+    '''
+        Text of a list of values written without quotes, like EN CURSO in the lineage. It is
+        rendered as it is written, so the rulesets keep the values of the lineage.
+    '''
+
+
+# Tokens of a DQDL ruleset: quoted strings, numbers, words, operators and punctuation
+_TOKEN_PATTERN = re.compile(r'\s*(?:(?P<string>"(?:[^"\\]|\\.)*")|(?P<number>-?[0-9]+(?:\.[0-9]+)?)'
+                            r'|(?P<operator><=|>=|!=|=|<|>)|(?P<word>[A-Za-z_][A-Za-z0-9_]*)|(?P<punct>[\[\],]))')
+_COMPARISONS = {
+    '=': np.equal,
+    '!=': np.not_equal,
+    '<': np.less,
+    '<=': np.less_equal,
+    '>': np.greater,
+    '>=': np.greater_equal
+}
+# A whole value of a list of the lineage: a quoted text or a number
+_QUOTED_VALUE_PATTERN = re.compile(r'"(?:[^"\\]|\\.)*"')
+_NUMBER_VALUE_PATTERN = re.compile(r'-?[0-9]+(?:\.[0-9]+)?')
+_STATUS_PASS = 'PASS'
+_STATUS_FAIL = 'FAIL'
+_STATUS_SKIPPED = 'SKIPPED'
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pa_csv
+    import pyarrow.parquet as pq
+    _PYARROW_AVAILABLE = True
+except ImportError:
+    _PYARROW_AVAILABLE = False
+
+
+def parse_ruleset(text: str):
+    '''
+        Function to parse a DQDL ruleset like the ones written by the data quality generator.
+        Parameters:
+            text (str): Ruleset, Rules = [rule, rule, ...]
+        Returns:
+            list: DqRule of each rule, in the order of the ruleset
+        Exceptions:
+            ValueError: Raised if the ruleset can not be parsed
+    '''
+    tokens = _tokenize(text)
+    if [kind for kind, _, _ in tokens[:3]] != ['word', 'operator', 'punct'] or tokens[0][1] != 'Rules' \
+            or tokens[1][1] != '=' or tokens[2][1] != '[' or tokens[-1][1] != ']':
+        raise ValueError('The ruleset must be Rules = [...]')
+
+    rules = []
+    rule_tokens = []
+    depth = 0
+    for token in tokens[3:-1]:
+        kind, value, _ = token
+        if kind == 'punct' and value == ',' and depth == 0:
+            rules.append(_parse_rule(text, rule_tokens))
+            rule_tokens = []
+            continue
+        if kind == 'punct' and value in '[]':
+            depth += 1 if value == '[' else -1
+        rule_tokens.append(token)
+    if rule_tokens:
+        rules.append(_parse_rule(text, rule_tokens))
+
+    return rules
+
+
+def parse_values(text: str):
+    '''
+        Function to parse the values of a ColumnValues rule, as they are written in the lineage
+        (1,2 or "A","B" or EN CURSO,FINALIZADO). The text is split on the commas first, and each
+        value is taken as a number, as a quoted text or, otherwise, as text written without quotes.
+        Parameters:
+            text (str): Values separated by commas
+        Returns:
+            tuple: Values, DqNumber for the numbers, str for the quoted text and DqUnquoted for the rest
+    '''
+    values = []
+    for value in text.split(','):
+        value = value.strip()
+        if not value:
+            continue
+        if _NUMBER_VALUE_PATTERN.fullmatch(value):
+            values.append(DqNumber(value))
+            continue
+        if _QUOTED_VALUE_PATTERN.fullmatch(value):
+            try:
+                values.append(json.loads(value))
+                continue
+            except ValueError:
+                pass
+        # Anything else, like a quoted text with a comma split above, is kept as it is written
+        values.append(DqUnquoted(value))
+
+    return tuple(values)
+
+
+def render_rule(rule: DqRule):
+    '''
+        Function to write a rule in DQDL.
+        Parameters:
+            rule (DqRule): Rule
+        Returns:
+            str: Rule in DQDL, <type> "<target>" [<operator> <value>]
+    '''
+    text = f'{rule.rule_type} {json.dumps(rule.target, ensure_ascii=False)}'
+    if rule.operator == 'in':
+        return f'{text} in [{",".join(_render_value(value) for value in rule.value)}]'
+    if rule.operator is not None:
+        return f'{text} {rule.operator} {float(rule.value)}'
+    return text
+
+
+def render_rulesets(rules: list, databases: list):
+    '''
+        Function to write a ruleset for each database, the rules that do not depend on the
+        database are rendered only once. The database is only written in the SchemaMatch rules,
+        whose target is the table name.
+        Parameters:
+            rules (list): DqRule of the ruleset, with the table name as the target of SchemaMatch
+            databases (list): Database of each ruleset
+        Returns:
+            list: Ruleset for each database, Rules = [rule, rule, ...]
+    '''
+    rendered = [None if rule.rule_type == 'SchemaMatch' else render_rule(rule) for rule in rules]
+
+    rulesets = []
+    for database in databases:
+        rule_texts = [
+            text if text is not None else render_rule(rule._replace(target=f'{database}.{rule.target}'))
+            for text, rule in zip(rendered, rules)
+        ]
+        rulesets.append(f'Rules = [{", ".join(rule_texts)}]')
+
+    return rulesets
+
+
+def read_extract(file_path: str, columns: list = None, sep: str = ','):
+    '''
+        Function to read an extract of a table to evaluate its rules.
+        The CSV files are read as text, with the empty cells as nulls, and the parquet files keep
+        their types. Only the columns used by the rules are loaded, in arrow backed columns.
+        Parameters:
+            file_path (str): Path to a CSV or parquet file
+            columns (list): Columns to load, None to load all of them
+            sep (str): Separator of the CSV files
+        Returns:
+            pd.DataFrame: Extract with the loaded columns
+            list: All the columns of the extract
+        Exceptions:
+            ImportError: Raised if pyarrow is not installed
+    '''
+    _check_pyarrow()
+    if file_path.lower().endswith('.parquet'):
+        all_columns = pq.read_schema(file_path).names
+        usecols = [column for column in all_columns if columns is None or column in columns]
+        return pd.read_parquet(file_path, columns=usecols, dtype_backend='pyarrow'), all_columns
+
+    all_columns = pd.read_csv(file_path, sep=sep, nrows=0).columns.tolist()
+    usecols = [column for column in all_columns if columns is None or column in columns]
+    table = pa_csv.read_csv(
+        file_path,
+        parse_options=pa_csv.ParseOptions(delimiter=sep),
+        convert_options=pa_csv.ConvertOptions(
+            include_columns=usecols,
+            column_types={column: pa.string() for column in usecols},
+            strings_can_be_null=True,
+            null_values=['']
+        )
+    )
+    return table.to_pandas(types_mapper=pd.ArrowDtype), all_columns
+
+
+def evaluate_ruleset(rules: list, df: pd.DataFrame, columns: list = None):
+    '''
+        Function to evaluate the rules of a ruleset against an extract of the table.
+        Each rule is evaluated over the whole columns at once. The rows with null values fail
+        ColumnValues, and are not checked by IsUnique and ColumnLength.
+        Parameters:
+            rules (list): DqRule of the ruleset
+            df (pd.DataFrame): Extract of the table
+            columns (list): All the columns of the extract, by default the ones of the dataframe
+        Returns:
+            list: Result of each rule, with its status (PASS, FAIL or SKIPPED), and the number of
+                rows that pass and fail for the row level rules
+        Exceptions:
+            ImportError: Raised if pyarrow is not installed
+    '''
+    _check_pyarrow()
+    columns = set(df.columns if columns is None else columns)
+    results = []
+    for rule in rules:
+        result = {'rule': render_rule(rule), 'status': _STATUS_SKIPPED, 'passed_rows': None, 'failed_rows': None}
+        if rule.rule_type == 'ColumnExists':
+            result['status'] = _STATUS_PASS if rule.target in columns else _STATUS_FAIL
+        elif rule.rule_type == 'SchemaMatch':
+            result['reason'] = 'The schema of the table can only be checked against the catalog'
+        elif rule.rule_type not in _ROW_CHECKS:
+            result['reason'] = f'Rule type {rule.rule_type} not supported'
+        elif rule.target not in df.columns:
+            result.update(status=_STATUS_FAIL, reason=f'Column {rule.target} not found')
+        else:
+            failed = _ROW_CHECKS[rule.rule_type](df[rule.target], rule)
+            failed_rows = int(np.count_nonzero(failed))
+            result.update(status=_STATUS_PASS if failed_rows == 0 else _STATUS_FAIL,
+                          passed_rows=len(df) - failed_rows, failed_rows=failed_rows)
+        results.append(result)
+
+    return results
+
+
+def run_evaluation(ruleset_path: str, data_path: str, sep: str = ',', report_path: str = None):
+    '''
+        Function to evaluate a ruleset file against an extract and log the result of each rule.
+        Parameters:
+            ruleset_path (str): Path to the ruleset file
+            data_path (str): Path to the CSV or parquet extract
+            sep (str): Separator of the CSV extracts
+            report_path (str): Path to save the results as JSON, if any
+        Returns:
+            bool: True if no rule failed, False if a rule failed or the evaluation could not be done
+    '''
+    start_time = time.perf_counter()
+    try:
+        with open(ruleset_path) as fp:
+            rules = parse_ruleset(fp.read())
+
+        df, columns = read_extract(data_path, [rule.target for rule in rules], sep)
+        logger.info(f'Evaluating {len(rules)} rules of {ruleset_path} on {len(df)} rows of {data_path}')
+        results = evaluate_ruleset(rules, df, columns)
+    except Exception as err:
+        # A missing or empty extract, or a malformed ruleset, is reported as a failed evaluation
+        logger.error(f'Error evaluating {ruleset_path} on {data_path}: {err}')
+        return False
+
+    for result in results:
+        rows = '' if result['failed_rows'] is None else f" - {result['passed_rows']} passed, {result['failed_rows']} failed"
+        reason = f" - {result['reason']}" if 'reason' in result else ''
+        logger.info(f"{result['status']}: {result['rule']}{rows}{reason}")
+
+    summary = {status: sum(result['status'] == status for result in results)
+               for status in (_STATUS_PASS, _STATUS_FAIL, _STATUS_SKIPPED)}
+    logger.info(f"{summary[_STATUS_PASS]} rules passed, {summary[_STATUS_FAIL]} failed and "
+                f"{summary[_STATUS_SKIPPED]} skipped - {time.perf_counter() - start_time:.2f}s")
+
+    if report_path is not None:
+        os.makedirs(os.path.dirname(os.path.abspath(report_path)), exist_ok=True)
+        with open(report_path, 'w') as fp:
+            json.dump({'ruleset': ruleset_path, 'data': data_path, 'rows': len(df),
+                       'summary': summary, 'rules': results}, fp, indent=4)
+
+    return summary[_STATUS_FAIL] == 0
+
+
+def _check_pyarrow():
+    '''
+        Function to check that pyarrow, used to read and evaluate the extracts, is installed.
+        Exceptions:
+            ImportError: Raised if pyarrow is not installed
+    '''
+    if not _PYARROW_AVAILABLE:
+        raise ImportError('The evaluation of the rules needs pyarrow')
+
+
+def _tokenize(text: str):
+    '''
+        Function to split a ruleset in tokens. The body of a list of values (in [...]) is kept as
+        a single values token, because the values without quotes of the lineage can have any
+        character (SÍ, S-N, A/B).
+        Parameters:
+            text (str): Ruleset
+        Returns:
+            list: (kind, value, position) of each token
+        Exceptions:
+            ValueError: Raised if there is an unexpected character or a list without its closing bracket
+    '''
+    tokens = []
+    position = 0
+    text = text.rstrip()
+    while position < len(text):
+        match = _TOKEN_PATTERN.match(text, position)
+        if match is None:
+            position += len(text[position:]) - len(text[position:].lstrip())
+            raise ValueError(f'Unexpected character {text[position]!r} at position {position} of the ruleset')
+        kind = match.lastgroup
+        tokens.append((kind, match.group(kind), match.start(kind)))
+        position = match.end()
+
+        if kind == 'word' and match.group(kind) == 'in':
+            start = position + len(text[position:]) - len(text[position:].lstrip())
+            if text.startswith('[', start):
+                end = _find_list_end(text, start + 1)
+                tokens.append(('punct', '[', start))
+                tokens.append(('values', text[start + 1:end], start + 1))
+                tokens.append(('punct', ']', end))
+                position = end + 1
+
+    return tokens
+
+
+def _find_list_end(text: str, position: int):
+    '''
+        Function to find the bracket that closes a list of values, skipping the quoted text.
+        Parameters:
+            text (str): Ruleset
+            position (int): Position of the first character of the list
+        Returns:
+            int: Position of the closing bracket
+        Exceptions:
+            ValueError: Raised if the list is not closed
+    '''
+    quoted = False
+    escaped = False
+    for index in range(position, len(text)):
+        char = text[index]
+        if escaped:
+            escaped = False
+        elif quoted and char == '\\':
+            escaped = True
+        elif char == '"':
+            quoted = not quoted
+        elif char == ']' and not quoted:
+            return index
+
+    raise ValueError(f'Missing closing bracket of the list of values at position {position - 1} of the ruleset')
+
+
+def _parse_rule(text: str, tokens: list):
+    '''
+        Function to parse the tokens of a rule: <type> "<target>" [<operator> <number> | in [<values>]].
+        Parameters:
+            text (str): Ruleset, to show the rule in the errors
+            tokens (list): Tokens of the rule
+        Returns:
+            DqRule: Parsed rule
+        Exceptions:
+            ValueError: Raised if the rule does not follow the format
+    '''
+    if len(tokens) < 2 or tokens[0][0] != 'word' or tokens[1][0] != 'string':
+        raise ValueError(f'Invalid rule at position {tokens[0][2] if tokens else len(text)} of the ruleset')
+
+    rule_type = tokens[0][1]
+    target = json.loads(tokens[1][1])
+    expression = tokens[2:]
+
+    if not expression:
+        return DqRule(rule_type, target, None, None)
+    if expression[0][0] == 'operator' and len(expression) == 2 and expression[1][0] == 'number':
+        return DqRule(rule_type, target, expression[0][1], float(expression[1][1]))
+    if expression[0][1] == 'in' and len(expression) == 4 and expression[2][0] == 'values':
+        return DqRule(rule_type, target, 'in', _get_values(expression[2][1], expression[2][2]))
+
+    end = tokens[-1][2] + len(tokens[-1][1])
+    raise ValueError(f'Invalid expression in rule {text[tokens[0][2]:end]}')
+
+
+def _get_values(text: str, position: int):
+    '''
+        Function to get the values of a list from the text inside its brackets. The text is split
+        on the commas that are not inside a quoted text, and each value is taken as a number, as a
+        quoted text or, otherwise, as text written without quotes (EN CURSO, SÍ, S-N).
+        Parameters:
+            text (str): Text inside the brackets of the list
+            position (int): Position of the text in the ruleset, to show it in the errors
+        Returns:
+            tuple: Values of the list, DqNumber for the numbers, str for the quoted text and
+                DqUnquoted for the text without quotes
+        Exceptions:
+            ValueError: Raised if there is an empty value, a bracket inside a value without quotes,
+                or a quoted text next to another text without a comma
+    '''
+    if not text.strip():
+        return ()
+
+    items = []
+    start = 0
+    quoted = False
+    escaped = False
+    for index, char in enumerate(text):
+        if escaped:
+            escaped = False
+        elif quoted and char == '\\':
+            escaped = True
+        elif char == '"':
+            quoted = not quoted
+        elif char == ',' and not quoted:
+            items.append((text[start:index], position + start))
+            start = index + 1
+    items.append((text[start:], position + start))
+
+    values = []
+    for item, item_position in items:
+        value = item.strip()
+        if not value:
+            raise ValueError(f'Empty value at position {item_position} of the list of values')
+        if _NUMBER_VALUE_PATTERN.fullmatch(value):
+            values.append(DqNumber(value))
+        elif _QUOTED_VALUE_PATTERN.fullmatch(value):
+            try:
+                values.append(json.loads(value))
+            except ValueError:
+                raise ValueError(f'Invalid quoted value {value} at position {item_position} of the list of values')
+        elif '"' in value:
+            raise ValueError(f'Missing comma in the value {value} at position {item_position} of the list of values')
+        elif '[' in value:
+            raise ValueError(f'Unexpected \'[\' in the value {value} at position {item_position} of the list of values')
+        else:
+            # The words of a value without quotes are joined with a single blank
+            values.append(DqUnquoted(' '.join(value.split())))
+
+    return tuple(values)
+
+
+def _render_value(value):
+    '''
+        Function to write a value of a list of values.
+        Parameters:
+            value (str): Value, DqNumber for the numbers and DqUnquoted for the text without quotes
+        Returns:
+            str: Number and text without quotes as they are, or quoted text
+    '''
+    if isinstance(value, (DqNumber, DqUnquoted)):
+        return str(value)
+    return json.dumps(str(value), ensure_ascii=False)
+
+
+def _to_arrow(series: pd.Series, as_text: bool = False):
+    '''
+        Function to get the values of a column as an arrow array, without copying the arrow backed
+        columns.
+        Parameters:
+            series (pd.Series): Column
+            as_text (bool): Cast the values to text
+        Returns:
+            pa.Array: Values of the column
+    '''
+    values = pa.array(series.array)
+    if isinstance(values, pa.ChunkedArray):
+        values = values.combine_chunks()
+    if as_text and not pa.types.is_string(values.type) and not pa.types.is_large_string(values.type):
+        values = pc.cast(values, pa.string())
+    return values
+
+
+def _check_is_complete(series: pd.Series, rule: DqRule):
+    '''
+        Function to get the rows that fail an IsComplete rule.
+        Parameters:
+            series (pd.Series): Column of the rule
+            rule (DqRule): Rule
+        Returns:
+            np.ndarray: True for the rows with a null value
+    '''
+    return series.isna().to_numpy()
+
+
+def _check_is_unique(series: pd.Series, rule: DqRule):
+    '''
+        Function to get the rows that fail an IsUnique rule.
+        Parameters:
+            series (pd.Series): Column of the rule
+            rule (DqRule): Rule
+        Returns:
+            np.ndarray: True for the rows whose value appears more than once
+    '''
+    codes, _ = pd.factorize(series)
+    counts = np.bincount(codes[codes >= 0], minlength=1)
+    return (codes >= 0) & (counts[np.maximum(codes, 0)] > 1)
+
+
+def _check_column_values(series: pd.Series, rule: DqRule):
+    '''
+        Function to get the rows that fail a ColumnValues rule. The values are compared as
+        numbers when the column is numeric, and as text otherwise.
+        Parameters:
+            series (pd.Series): Column of the rule
+            rule (DqRule): Rule
+        Returns:
+            np.ndarray: True for the rows with a value out of the list or the comparison, or with a null value
+    '''
+    numeric = pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series)
+    if rule.operator != 'in':
+        values = series if numeric else pd.to_numeric(series, errors='coerce')
+        return ~_COMPARISONS[rule.operator](values.to_numpy(dtype=float, na_value=np.nan), rule.value)
+
+    if numeric:
+        values = _to_arrow(series)
+        allowed = pa.array(pd.to_numeric(pd.Series(rule.value, dtype=object), errors='coerce').dropna(), type=pa.float64())
+        passed = pc.is_in(pc.cast(values, pa.float64()), value_set=allowed)
+    else:
+        passed = pc.is_in(_to_arrow(series, as_text=True), value_set=pa.array([str(value) for value in rule.value]))
+    # is_in is false for the nulls, they are not in the list
+    return ~passed.to_numpy(zero_copy_only=False)
+
+
+def _check_column_length(series: pd.Series, rule: DqRule):
+    '''
+        Function to get the rows that fail a ColumnLength rule.
+        Parameters:
+            series (pd.Series): Column of the rule
+            rule (DqRule): Rule
+        Returns:
+            np.ndarray: True for the rows whose value length does not satisfy the comparison
+    '''
+    lengths = pc.cast(pc.utf8_length(_to_arrow(series, as_text=True)), pa.float64()).to_numpy(zero_copy_only=False)
+    # The comparisons with the null lengths (NaN) are false, they are not checked
+    return ~_COMPARISONS[rule.operator](lengths, rule.value) & ~np.isnan(lengths)
+
+
+_ROW_CHECKS = {
+    'IsComplete': _check_is_complete,
+    'IsUnique': _check_is_unique,
+    'ColumnValues': _check_column_values,
+    'ColumnLength': _check_column_length
+}
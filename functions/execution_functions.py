@@ -0,0 +1,76 @@
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import nullcontext
+from logger import logger, configure_logging
+from config import config
+
+_EXECUTION_MODES = ('serial', 'thread', 'process')
+
+
+def create_executor(mode: str = None, allow_processes: bool = True):
+    '''
+        Function to create the executor for the generators, based on the execution section of the config.
+        Parameters:
+            mode (str): Execution mode to use instead of the one in the config
+            allow_processes (bool): False if the generators can not run in other processes, the
+                process mode runs them in threads instead
+        Returns:
+            Executor: Thread or process pool, or a null context for the serial mode. It must be used
+                as a context manager, and the serial mode yields None.
+        Exceptions:
+            ValueError: Raised if the execution mode is not valid
+    '''
+    mode = (mode or config.get('execution', 'mode', fallback='serial')).lower()
+    workers = config.getint('execution', 'workers', fallback=3)
+
+    if mode not in _EXECUTION_MODES:
+        raise ValueError(f'Invalid execution mode {mode}, it must be one of {", ".join(_EXECUTION_MODES)}')
+
+    if mode == 'process' and not allow_processes:
+        logger.warning('The outputs can not be written from other processes, running generators in thread mode')
+        mode = 'thread'
+
+    logger.debug(f'Running generators in {mode} mode')
+    if mode == 'thread':
+        return ThreadPoolExecutor(max_workers=workers)
+    if mode == 'process':
+        return ProcessPoolExecutor(max_workers=workers, initializer=configure_logging)
+    return nullcontext()
+
+
+def submit_task(executor, function, *args):
+    '''
+        Function to run a function in the executor, or right away when there is no executor.
+        Parameters:
+            executor (Executor): Executor to run the function, None to run it in the current thread
+            function (callable): Function to run
+            args: Arguments for the function
+        Returns:
+            Future: Future with the result or the exception of the function
+    '''
+    if executor is not None:
+        return executor.submit(function, *args)
+
+    future = Future()
+    try:
+        future.set_result(function(*args))
+    except Exception as err:
+        future.set_exception(err)
+    return future
+
+
+def collect_errors(tasks: list):
+    '''
+        Function to wait for some tasks and collect their errors, without stopping at the first one.
+        Parameters:
+            tasks (list): List of (name, future) tuples
+        Returns:
+            list: Error messages of the failed tasks
+    '''
+    errors = []
+    for name, future in tasks:
+        err = future.exception()
+        if err is not None:
+            logger.error(f'Error in {name}: {err}')
+            errors.append(f'{name}: {err}')
+
+    return errors
@@ -1,55 +1,51 @@
-import argparse
 import os
-import re
 import pandas as pd
 import numpy as np
 import shutil
 from logger import logger
 from config import config
-from tabulate import tabulate
-from contextlib import redirect_stdout
-
-_LINEAGE_FOLDER = config['folders']['lineaje_folder']
-_LINEAGE_FIELDS = config['folders']['parameter_file_folder']
-
-# Validation parameters function
-def validate_parameters():
-    '''
-        Auxiliar function to validate parameters
-        Returns:
-            args: input parameters
-    '''
-    logger.info('Validating input parameters')
-    parser = argparse.ArgumentParser()
-    parser.add_argument('--legado', type=str, required=True, choices=['APET','APMV','AYMV','BDUC','GTFN','HSSR','PISO','PNC','RGM','RMIN','SIDM','SIMP','SOIC'])
-    args = parser.parse_args()
-    return args
-
-
+from functions.catalog_functions import get_master_field_catalog
+from functions.cache_functions import get_file_hash, get_cached_dataframe, store_cached_dataframe
+from functions.lineage_index_functions import get_lineage_index
+from functions.workbook_reader_functions import open_workbook_reader
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    _PARQUET_AVAILABLE = True
+except ImportError:
+    _PARQUET_AVAILABLE = False
+
+# Increase when the output of _parse_lineage_and_extract_information changes, to invalidate the cache
+_LINEAGE_PARSER_VERSION = 1
+# Values read as NaN, the same as pandas.read_excel
+_EXCEL_NA_VALUES = {
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+    '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null',
+    '#NULL!', '#DIV/0!', '#VALUE!', '#REF!', '#NAME?', '#NUM!'
+}
+# Schemas of the lineage workbooks
+_LINEAGE_SCHEMAS = ['ruu', 'russ']
+# Metadata key of the parquet lineages with the parser version that converted them
+_PARSER_VERSION_KEY = b'lineage_parser_version'
 # Prepare folder strcuture functions
 def create_folder_structure(legacy: str):
     '''
         Function to create the folder structure for a given legacy.
+        The legacy folders are not created here, they are published by LegacyOutput when the
+        legacy is generated successfully.
         Parameters:
             legacy (str): Name of the legacy for which the folder structure will be created.
     '''
     logger.info(f"Creating folder structure for {legacy}")
 
     # Parent folder
-    create_folder(config.get('folders', 'output_folder'))
+    create_folder(config.getpath('folders', 'output_folder'))
 
     # Function folders
-    create_folder(config.get('folders', 'dmstask_output_folder'))
-    create_folder(config.get('folders', 'government_output_folder'))
-    create_folder(config.get('folders', 'dataquality_output_folder'))
-
-    # Legacy folders
-    delete_folder(f"{config.get('folders', 'dmstask_output_folder')}/{legacy}")
-    create_folder(f"{config.get('folders', 'dmstask_output_folder')}/{legacy}")
-    delete_folder(f"{config.get('folders', 'government_output_folder')}/{legacy}")
-    create_folder(f"{config.get('folders', 'government_output_folder')}/{legacy}")
-    delete_folder(f"{config.get('folders', 'dataquality_output_folder')}/{legacy}")
-    create_folder(f"{config.get('folders', 'dataquality_output_folder')}/{legacy}")
+    create_folder(config.getpath('folders', 'dmstask_output_folder'))
+    create_folder(config.getpath('folders', 'government_output_folder'))
+    create_folder(config.getpath('folders', 'dataquality_output_folder'))
 
     logger.info(f"Folder structure created for {legacy}")
 
@@ -82,7 +78,7 @@ def create_folder(folder: str):
     try:
         if not os.path.exists(folder):
             logger.debug(f'Creating folder {folder}')
-            os.mkdir(folder)
+            os.makedirs(folder, exist_ok=True)
     except Exception as err:
         logger.error(f"Error creating folder: {err}")
         raise Exception(f"Error creating folder: {err}")
@@ -91,38 +87,109 @@ def create_folder(folder: str):
 # Config file functions
 def get_config(schema: str):
     '''
-        The function reads json files which contains the informaton about all fields for each table.
+        The function gets the informaton about all fields for each table from the master fields catalog.
         Parameters:
             schema (str): Schema name for get the fields
         Returns:
             pd.DataFrame: Dataframe with all fields for the schema
     '''
-    config_df = pd.read_csv(_LINEAGE_FIELDS, sep=';', dtype=str, header=0)
-    config_df['primary_key'] = config_df['primary_key'].fillna('N')
-    config_df['field_length'] = config_df['field_length'].fillna(0)
-    config_df.ffill(inplace=True)
-    config_df = config_df[config_df['schema'] == schema]
-    config_df.reset_index(drop=True, inplace=True)
-    config_df = config_df.map(lambda x: x.upper() if isinstance(x, str) else x)
-    config_df.columns = map(str.upper, config_df.columns)
-
-    return config_df
+    return get_master_field_catalog().get_schema(schema)
 
 
 # Excel lineage files functions
-def parse_lineage_excel(legacy: str, file_path: str, schema: str):
+class LineageWorkbook:
+    '''
+        Session over a lineage excel that opens the workbook only once per run.
+        The same handle is shared by every schema, so the RUU and RUSS sheets are read
+        from the file without unzipping and parsing it again for each of them.
+        The workbook is opened with the reader engine of the config and the sheets are read
+        row by row, keeping only the cells of the column groups that are going to be used.
+        Parameters:
+            file_path (str): Path to the lineage file.
+            engine (str): Reader engine, by default the one of the config.
+    '''
+    def __init__(self, file_path: str, engine: str = None):
+        self.file_path = file_path
+        self.engine = engine
+        self._reader = None
+        self._content_hash = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def reader(self):
+        '''
+            Reader of the workbook, opened on first use.
+        '''
+        if self._reader is None:
+            self._reader = open_workbook_reader(self.file_path, self.engine)
+        return self._reader
+
+    @property
+    def content_hash(self):
+        '''
+            Hash of the workbook content, calculated on first use.
+        '''
+        if self._content_hash is None:
+            self._content_hash = get_file_hash(self.file_path)
+        return self._content_hash
+
+    def get_sheet(self, schema: str, column_groups: list):
+        '''
+            Function to read the sheet of a schema from the opened workbook.
+            Only the columns under the given first level headers are loaded, the rest of
+            the sheet is skipped while streaming the rows.
+            Parameters:
+                schema (str): Schema name for get the sheet
+                column_groups (list): First level headers of the column groups to load
+            Returns:
+                pd.DataFrame: Dataframe with a two level header and the columns of the groups,
+                    empty if there is no sheet for the schema
+        '''
+        for sheet in self.reader.sheet_names:
+            if sheet.lower().__contains__(schema.lower()):
+                return _read_sheet_columns(self.reader.iter_rows(sheet), column_groups)
+
+        return pd.DataFrame()
+
+    def close(self):
+        '''
+            Close the workbook handle if it was opened.
+        '''
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
+
+
+def parse_lineage_excel(legacy: str, workbook: LineageWorkbook, schema: str):
     '''
         Function to read the lineage file for a given legacy.
         Parameters:
             legacy (str): Name of the legacy file to read.
-            file_path (str): Path to the lineage file.
+            workbook (LineageWorkbook): Opened lineage workbook.
             schema (str): Schema name for get the fields
         Returns:
             pd.DataFrame: DataFrame containing the lineage information.
     '''
     logger.info(f"Reading lineage excel for {legacy}")
 
-    lineage_df = _parse_lineage_and_extract_information(file_path, schema)
+    # A lineage converted with the convert command is read from its parquet file, without opening the excel
+    lineage_df = read_lineage_parquet(workbook.file_path, schema)
+    if lineage_df is None:
+        # Parsed lineage is cached by workbook content, so unchanged files are not parsed again
+        cache_key = f'{workbook.content_hash}_{schema}_v{_LINEAGE_PARSER_VERSION}'
+        lineage_df = get_cached_dataframe(cache_key)
+        if lineage_df is None:
+            lineage_df = _parse_lineage_and_extract_information(workbook, schema)
+            if not lineage_df.empty:
+                store_cached_dataframe(cache_key, lineage_df)
+
+    if lineage_df.empty:
+        return lineage_df
 
     # Workaround para DET_EPISODIOS y DET_APUNTES
     lineage_df['LEGACY_NOMBRE_VISTA'] = np.where(lineage_df['LEGACY_NOMBRE_VISTA'] == f'{legacy}_VM_HSTA_DET_EPISODIO', f'{legacy}_VM_HSTA_DET_EPISODIOS', lineage_df['LEGACY_NOMBRE_VISTA'])
@@ -143,96 +210,166 @@ def get_last_lineage_file(legacy: str):
     '''
     logger.info(f"Getting last lineage excel for {legacy}")
 
-    lineages = _get_lineages_legacy(legacy)
-
-    lineage_legacy_list = []
-    for item in lineages:
-        if item.__contains__(legacy):
-            lineage_legacy_list.append(item)
-
-    if len(lineage_legacy_list) == 0:
+    last_lineage = get_lineage_index().get_last(legacy)
+    if last_lineage is None:
         logger.error(f'No lineage found for {legacy}')
         raise FileNotFoundError(f'No lineage found for {legacy}')
 
-    last_lineage = _get_last_version(lineage_legacy_list)
-
     logger.info(f'Got the last lineage: {last_lineage}')
 
-    return f'{_LINEAGE_FOLDER}{last_lineage}'
+    return f"{config.getpath('folders', 'lineaje_folder')}{last_lineage}"
 
 
-def _get_lineages_legacy(legacy: str):
+def find_last_lineage_file(legacy: str):
     '''
-        Function to get all lineage files for a given legacy.
+        Function to get the latest version of the lineage file of a legacy, without failing if
+        there is none. It is used to poll the lineage folder.
         Parameters:
-            legacy (str): Name of the legacy file for which lineage files will be searched.
+            legacy (str): Name of the legacy file for which the latest lineage file will be searched.
         Returns:
-            list: List of lineage file names that contain the legacy name.
+            str: The full path of the last lineage file found, or None if there is no versioned lineage.
     '''
-    lineage_file_list = os.listdir(_LINEAGE_FOLDER)
-    lineage_file_list = [item for item in lineage_file_list if item.__contains__(legacy)]
+    last_lineage = get_lineage_index().get_last(legacy)
+    if last_lineage is None:
+        return None
 
-    return lineage_file_list
+    return f"{config.getpath('folders', 'lineaje_folder')}{last_lineage}"
 
 
-def _get_last_version(lineage_file_list: list):
+def get_lineage_parquet_path(lineage_path: str, schema: str):
     '''
-        Function to get the latest version of a lineage file based on a version pattern.
+        Function to get the path of the parquet conversion of a schema of a lineage, next to the excel.
         Parameters:
-            lineage_file_list (list): List of lineage file names that contain versions in their name.
+            lineage_path (str): Path to the lineage excel
+            schema (str): Schema name
         Returns:
-            str: The name of the file that has the latest version.
-        Exceptions:
-            FileNotFoundError: Raised if no valid version is found in the list of lineage files.
+            str: Path of the parquet file, HSU_<legacy>_Linaje_de_datos vXX.X.<schema>.parquet
     '''
-    logger.debug(f"Getting last version for {lineage_file_list}")
+    return f'{os.path.splitext(lineage_path)[0]}.{schema}.parquet'
 
-    # Defines
-    pattern = r'v([0-9]+\.[0-9]+)'
-    last_version = 0
-    return_item = ''
 
-    for item in lineage_file_list:
-        version_file = re.search(pattern, item)
-        if version_file is None: break
-        version_file = float(version_file.group(1))
-        if last_version < version_file:
-            return_item = item
-            last_version = version_file
+def read_lineage_parquet(lineage_path: str, schema: str):
+    '''
+        Function to read the parsed lineage of a schema from its parquet conversion.
+        The conversion is only used if it is newer than the excel and was written by the current parser.
+        Parameters:
+            lineage_path (str): Path to the lineage excel
+            schema (str): Schema name
+        Returns:
+            pd.DataFrame: Parsed lineage, or None if there is no valid conversion
+    '''
+    parquet_path = get_lineage_parquet_path(lineage_path, schema)
+    if not _PARQUET_AVAILABLE or not os.path.exists(parquet_path):
+        return None
 
-    logger.debug(f'Got the last version: {last_version}')
+    reason = _check_lineage_parquet(lineage_path, parquet_path)
+    if reason is not None:
+        logger.warning(f'Ignoring {parquet_path}, {reason}')
+        return None
 
-    if return_item == '':
-        logger.error(f'No version found for {lineage_file_list}')
-        raise FileNotFoundError(f'No version found for {lineage_file_list}')
+    try:
+        lineage_df = pq.read_table(parquet_path).to_pandas()
+    except Exception as err:
+        logger.warning(f'Error reading {parquet_path}, ignoring it: {err}')
+        return None
 
-    return return_item
+    logger.debug(f'Read the parsed lineage from {parquet_path}')
+    return lineage_df
 
 
-def _parse_lineage_and_extract_information(file_path: str, schema: str):
+def is_lineage_converted(lineage_path: str):
+    '''
+        Function to check if all the schemas of a lineage have a valid parquet conversion.
+        Parameters:
+            lineage_path (str): Path to the lineage excel
+        Returns:
+            bool: True if no schema needs to be converted again
+    '''
+    return _PARQUET_AVAILABLE and all(
+        _check_lineage_parquet(lineage_path, get_lineage_parquet_path(lineage_path, schema)) is None
+        for schema in _LINEAGE_SCHEMAS
+    )
+
+
+def convert_lineage(lineage_path: str):
+    '''
+        Function to convert a lineage excel to one parquet file per schema, with the same dataframe
+        the lineage parser gives. The schemas without sheet are also written, empty, so the excel
+        is never opened again.
+        Parameters:
+            lineage_path (str): Path to the lineage excel
+        Returns:
+            list: Paths of the parquet files written
+        Exceptions:
+            ImportError: Raised if pyarrow is not installed
+    '''
+    if not _PARQUET_AVAILABLE:
+        raise ImportError('The lineage conversion needs pyarrow')
+
+    parquet_paths = []
+    with LineageWorkbook(lineage_path) as workbook:
+        for schema in _LINEAGE_SCHEMAS:
+            lineage_df = _parse_lineage_and_extract_information(workbook, schema)
+            table = pa.Table.from_pandas(lineage_df, preserve_index=False)
+            table = table.replace_schema_metadata({
+                **(table.schema.metadata or {}),
+                _PARSER_VERSION_KEY: str(_LINEAGE_PARSER_VERSION).encode()
+            })
+
+            # Write to a temporary file first so a run never reads a partial conversion
+            parquet_path = get_lineage_parquet_path(lineage_path, schema)
+            tmp_path = f'{parquet_path}.{os.getpid()}.tmp'
+            pq.write_table(table, tmp_path)
+            os.replace(tmp_path, parquet_path)
+            logger.info(f'Converted {schema} of {os.path.basename(lineage_path)}: {len(lineage_df)} rows')
+            parquet_paths.append(parquet_path)
+
+    return parquet_paths
+
+
+def _check_lineage_parquet(lineage_path: str, parquet_path: str):
+    '''
+        Function to check if the parquet conversion of a lineage can be used, reading only its schema.
+        Parameters:
+            lineage_path (str): Path to the lineage excel
+            parquet_path (str): Path to the parquet conversion
+        Returns:
+            str: Reason why the conversion can not be used, None if it is valid
+    '''
+    if not os.path.exists(parquet_path):
+        return 'it does not exist'
+    if os.stat(parquet_path).st_mtime_ns < os.stat(lineage_path).st_mtime_ns:
+        return 'it is older than the lineage excel'
+
+    try:
+        metadata = pq.read_schema(parquet_path).metadata or {}
+    except Exception as err:
+        return f'it can not be read: {err}'
+    if metadata.get(_PARSER_VERSION_KEY) != str(_LINEAGE_PARSER_VERSION).encode():
+        return 'it was converted by another version of the parser'
+
+    return None
+
+
+def _parse_lineage_and_extract_information(workbook: LineageWorkbook, schema: str):
     '''
         This function read and excel sheet for schema and return dataframe with the needed info
         Parameters:
-            file_path (str): Path to the lineage file.
+            workbook (LineageWorkbook): Opened lineage workbook.
             schema (str): Schema name for get the fields
         Return:
             pd.Dataframe: Dataframe with the needed info
     '''
-    logger.debug(f'Checking {schema} for {file_path}')
+    logger.debug(f'Checking {schema} for {workbook.file_path}')
 
     # Defines
-    src_df = pd.DataFrame()
     lookup_column_name = {
         "ruu": "Tabla Legacy VM [FUENTE]",
         "russ": "Tabla Legacy [FUENTE]"
     }
 
     # Check if the sheet for RUU/RUSS exists
-    excel_file = pd.ExcelFile(file_path)
-    for sheet in excel_file.sheet_names:
-        if sheet.lower().__contains__(schema.lower()):
-            src_df = pd.read_excel(file_path, sheet_name=sheet, dtype=str, header=[0,1])
-            break
+    src_df = workbook.get_sheet(schema, [lookup_column_name.get(schema), 'LANDING', 'STAGING', 'Valores Formateados'])
 
     if src_df.empty:
         logger.error(f'No sheet found for {schema}')
@@ -284,4 +421,126 @@ def _get_subset_df(src_df: pd.DataFrame, columns_to_search: str):
         subset_df.columns = [f"LEGACY_{col.upper().replace(' ', '_')}" for col in subset_df.columns.get_level_values(1)]
         subset_df = subset_df.iloc[:, :-1]
 
-    return subset_df
\ No newline at end of file
+    return subset_df
+
+
+def _read_sheet_columns(rows, column_groups: list):
+    '''
+        Function to read the rows of a lineage sheet and load only the columns of some column groups.
+        The first two rows are the header, merged cells of the first level are filled forward
+        and the cells are converted to strings in the same way as pandas.read_excel with dtype=str.
+        Parameters:
+            rows (iterator): Rows of the sheet, as returned by the workbook readers.
+            column_groups (list): First level headers of the column groups to load.
+        Returns:
+            pd.DataFrame: Dataframe with a two level header and the columns of the groups.
+    '''
+    rows = iter(rows)
+
+    # Read the two header rows
+    header = [list(next(rows, ())), list(next(rows, ()))]
+    width = max(len(header[0]), len(header[1]))
+    header = [[_convert_header_cell(value) for value in row] + [''] * (width - len(row)) for row in header]
+    header = _fill_header(header)
+
+    # Look for the positions of the needed column groups
+    column_indexes = [index for index, name in enumerate(header[0]) if name in column_groups]
+    if not column_indexes:
+        return pd.DataFrame()
+
+    columns = _deduplicate_columns([
+        (header[0][index] or f'Unnamed: {index}_level_0', header[1][index] or f'Unnamed: {index}_level_1')
+        for index in column_indexes
+    ])
+
+    # Stream the rows keeping only the needed cells. Rows without values in those cells are
+    # skipped, they would be discarded later because they have no field name
+    column_values = [[] for _ in column_indexes]
+    for row in rows:
+        row_values = [_convert_cell(row[index]) if index < len(row) else np.nan for index in column_indexes]
+        if all(value is np.nan for value in row_values):
+            continue
+        for values, value in zip(column_values, row_values):
+            values.append(value)
+
+    src_df = pd.DataFrame({position: values for position, values in enumerate(column_values)}, dtype=object)
+    src_df.columns = pd.MultiIndex.from_tuples(columns)
+
+    return src_df
+
+
+def _fill_header(header: list):
+    '''
+        Function to fill forward the empty header cells left by merged cells, level by level.
+        Parameters:
+            header (list): List with the header rows.
+        Returns:
+            list: Header rows with the empty cells filled.
+    '''
+    new_group = [False] * len(header[0])
+    for row in header:
+        last = row[0] if row else ''
+        for index in range(1, len(row)):
+            if new_group[index]:
+                last = row[index]
+            if row[index] == '':
+                row[index] = last
+            else:
+                new_group[index] = True
+                last = row[index]
+
+    return header
+
+
+def _deduplicate_columns(columns: list):
+    '''
+        Function to rename duplicated column names adding a numeric suffix, as pandas does.
+        Parameters:
+            columns (list): List of column name tuples.
+        Returns:
+            list: Column name tuples without duplicates.
+    '''
+    counts = {}
+    deduplicated = []
+    for column in columns:
+        count = counts.get(column, 0)
+        while count > 0:
+            counts[column] = count + 1
+            column = column[:-1] + (f'{column[-1]}.{count}',)
+            count = counts.get(column, 0)
+        deduplicated.append(column)
+        counts[column] = count + 1
+
+    return deduplicated
+
+
+def _convert_header_cell(value):
+    '''
+        Function to convert a header cell value to string.
+        Parameters:
+            value: Raw cell value.
+        Returns:
+            str: Header name, empty string for empty cells.
+    '''
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value)
+
+
+def _convert_cell(value):
+    '''
+        Function to convert a cell value to string, or NaN for empty and not available values.
+        Parameters:
+            value: Raw cell value.
+        Returns:
+            str: Cell value as string or NaN.
+    '''
+    if value is None:
+        return np.nan
+    if isinstance(value, str):
+        return np.nan if value in _EXCEL_NA_VALUES else value
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value)
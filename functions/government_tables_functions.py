@@ -1,51 +1,68 @@
 import pandas as pd
 import numpy as np
-from config import config
 from logger import logger
+from functions.partition_functions import LineageProjection, join_lineage
+from functions.output_functions import LegacyOutput
+from functions.manifest_functions import get_table_key, get_fingerprint, is_unchanged, create_entry
 
-_OUTPUT_FOLDER = config['Folders']['government_output_folder']
 _GOV_COLUMNS = [ 
     "owner", "table_name", "column_namedata_type", "column_namedata_type_aurora", "check_type", "type_create_lnd",
     "type_create", "char_length", "data_precisiondata_scale", "nullable", "format_data", "is_landing"
 ]
 
-def generate_government_tables(df: pd.DataFrame, config_df: pd.DataFrame, legacy: str):
+def generate_government_tables(lineage: LineageProjection, partitions: list, legacy: str, schema: str, manifest: dict,
+                               output: LegacyOutput):
     """
         Generate government tables based on the provided dataframes and legacy system information.
 
         Parameters:
-            df (pd.DataFrame): The main DataFrame containing data for table generation.
-            config_df (pd.DataFrame): Configuration DataFrame with legacy view and field names.
+            lineage (LineageProjection): Read-only projection of the lineage with the landing and staging columns.
+            partitions (list): List of TablePartition with the configuration and lineage join of each table.
             legacy (str): The legacy system identifier used in the naming conventions.
+            schema (str): The schema of the tables.
+            manifest (dict): Tables of the previous manifest of the legacy, the unchanged tables are skipped.
+            output (LegacyOutput): Staged outputs of the legacy.
+
+        Returns:
+            dict: Manifest entries of the tables of the schema.
 
         The function processes the configuration and main DataFrames to produce government
         tables as CSV files, applying transformations and filtering based on defined rules.
     """
-    # Replace 'LEGADO' with the specified legacy system in the LEGACY_VIEW column
-    config_df['LEGACY_VIEW'] = config_df['LEGACY_VIEW'].str.replace('LEGADO', legacy.upper())
-    
-    # Merge the configuration DataFrame with the main DataFrame
-    logger.info('Merging configuration and main dataframes')
-    join_df = pd.merge(config_df, df, left_on=['LEGACY_VIEW', 'FIELD_NAME'],
-                       right_on=['LEGACY_NOMBRE_VISTA','LANDING_NOMBRE_CAMPO'], how='left')
-    
     logger.info('Processing legacy tables, one by one.')
-    legacy_tables = config_df['LEGACY_VIEW'].unique().tolist()
-    for legacy_table in legacy_tables:
-        _process_legacy_table(join_df, legacy_table, legacy)
+    entries = {}
+    for partition in partitions:
+        key = get_table_key('government', schema, partition.legacy_view)
+        entries[key] = _process_legacy_table(lineage, partition, legacy, manifest, key, output)
+
+    return entries
 
 
-def _process_legacy_table(join_df: pd.DataFrame, legacy_table: str, legacy: str):
+def _process_legacy_table(lineage: LineageProjection, partition, legacy: str, manifest: dict, key: str, output: LegacyOutput):
     """
     Process and generate government table for a specific legacy table.
 
     Parameters:
-        join_df (pd.DataFrame): The merged DataFrame from configuration and main data.
-        legacy_table (str): The name of the legacy table being processed.
+        lineage (LineageProjection): Read-only projection of the lineage with the landing and staging columns.
+        partition (TablePartition): The configuration and lineage join of the legacy table.
         legacy (str): The legacy system identifier.
+        manifest (dict): Tables of the previous manifest of the legacy.
+        key (str): Key of the table in the manifest.
+        output (LegacyOutput): Staged outputs of the legacy.
+
+    Returns:
+        dict: Manifest entry of the table.
     """
-    logger.debug(f'Getting information for {legacy_table}')
-    join_df_filtered = join_df[join_df['LEGACY_VIEW'] == legacy_table].reset_index(drop=True)
+    logger.debug(f'Getting information for {partition.lineage_view}')
+
+    # Join the configuration of the table with its lineage by landing field name
+    join_df_filtered = join_lineage(partition.config_df, lineage, partition.landing_join)
+
+    fingerprint = get_fingerprint(join_df_filtered)
+    if is_unchanged(manifest, key, fingerprint, output, 'government'):
+        logger.debug(f'Skipping government table for {partition.lineage_view}, inputs unchanged')
+        output.keep('government', manifest[key]['files'])
+        return manifest[key]
 
     gov_df = pd.DataFrame(columns=_GOV_COLUMNS)
 
@@ -58,106 +75,87 @@ def _process_legacy_table(join_df: pd.DataFrame, legacy_table: str, legacy: str)
     gov_df['is_landing'] = "True"
     
     logger.debug('Extract valueds for goverment table fields.')
-    # Populate the government DataFrame with processed row data
-    for index, row in join_df_filtered.iterrows():
-        _populate_gov_dataframe(gov_df, index, row)
+    # Populate the government DataFrame with the type information of the whole table at once
+    landing_type, char_length, number_length = _process_columns(join_df_filtered, 'LANDING')
+    staging_type, _, _ = _process_columns(join_df_filtered, 'STAGING')
+
+    gov_df['type_create_lnd'] = landing_type
+    gov_df['char_length'] = char_length
+    gov_df['data_precisiondata_scale'] = number_length
+    gov_df['type_create'] = staging_type
+
+    # Determine nullable status based on LANDING_OBLIGATORIO column
+    gov_df['nullable'] = np.where(join_df_filtered['LANDING_OBLIGATORIO'].astype(str) == 'True', 'N', 'Y')
 
     # Save the government DataFrame to CSV
-    target_table = join_df_filtered['TARGET_TABLE'].unique()[0]
-    gov_df.to_csv(f'{_OUTPUT_FOLDER}/{legacy}/{target_table.lower()}.csv', index=False, sep=';')
+    target_table = partition.target_table
+    file = f'{target_table.lower()}.csv'
+    with output.open('government', file, newline='') as fp:
+        gov_df.to_csv(fp, index=False, sep=';')
     
     # Process staging records and save error CSV
     gov_df['is_stg'] = 'True'
     gov_df = _add_records(gov_df, legacy, target_table)
-    gov_df.to_csv(f'{_OUTPUT_FOLDER}/{legacy}/{target_table.lower()}_error.csv', index=False, sep=';')
-
+    error_file = f'{target_table.lower()}_error.csv'
+    with output.open('government', error_file, newline='') as fp:
+        gov_df.to_csv(fp, index=False, sep=';')
 
-def _populate_gov_dataframe(gov_df: pd.DataFrame, index: int, row: pd.Series):
-    """
-    Populate the government DataFrame with data from a single row.
-
-    Parameters:
-        gov_df (pd.DataFrame): The government DataFrame to be populated.
-        index (int): The current row index.
-        row (pd.Series): The row data from the merged DataFrame.
-    """
-    # Process each row for LANDING and STAGING types
-    landing_values = _process_row(row, 'LANDING')
-    staging_values = _process_row(row, 'STAGING')
-
-    gov_df.loc[index, 'type_create_lnd'] = landing_values[0]
-    gov_df.loc[index, 'char_length'] = landing_values[1]
-    gov_df.loc[index, 'data_precisiondata_scale'] = landing_values[2]
-    gov_df.loc[index, 'type_create'] = staging_values[0]
-    
-    # Determine nullable status based on LANDING_OBLIGATORIO column
-    gov_df.loc[index, 'nullable'] = 'N' if str(row['LANDING_OBLIGATORIO']) == 'True' else 'Y'
+    return create_entry(fingerprint, [file, error_file])
 
 
-def _process_row(row: pd.Series, context: str):
+def _process_columns(df: pd.DataFrame, context: str):
     """
-    Process a row of data to extract relevant information based on the context.
+    Extract the type information of all the rows of a table based on the context.
 
     Parameters:
-        row (pd.Series): A single row from the DataFrame to process.
-        context (str): The context to process the row for, such as 'LANDING' or 'STAGING'.
+        df (pd.DataFrame): The merged DataFrame of a table.
+        context (str): The context to process the rows for, such as 'LANDING' or 'STAGING'.
 
     Returns:
-        tuple: A tuple containing the necessary data extracted from the row:
+        tuple: A tuple of Series with the data extracted from the rows:
                - type_create for the respective context
-               - char_length (if applicable)
-               - data_precisiondata_scale (if applicable)
+               - char_length (only for LANDING)
+               - data_precisiondata_scale (only for LANDING)
     """
-    # Initialize default values
-    data_type = np.nan
-    char_length = np.nan
-    number_length = np.nan
-
-    # Fill NaN values with empty strings for consistent processing
-    row = row.fillna('')
-
-    # Determine the column to check based on the context
-    column_to_check = 'LANDING_TIPO_DE_DATO' if context == 'LANDING' else 'STAGING_TIPO_DE_DATO'
-
-    # Check for specific column and switch if empty
-    if row[column_to_check] == '':
-        column_to_check = 'CHECK_FIELD_TYPE'
-
-    # Extract the data type from the relevant column
-    type_column = row[column_to_check]
-    if type_column.__contains__('VARCHAR2'):
-        data_type = 'string'
-        if context == 'LANDING':
-            char_length = _extract_length(type_column)
-    elif type_column == 'TIMESTAMP':
-        data_type = 'timestamp'
-    elif type_column == 'DATE':
-        data_type = 'string'
-    elif type_column.__contains__('NUMBER'):
-        data_type = 'int'
-        if context == 'LANDING' and type_column.__contains__('('):
-            number_length = _extract_length(type_column)
-    elif type_column.__contains__('FLOAT'):
-        data_type = 'float'
-        if context == 'LANDING' and type_column.__contains__('('):
-            number_length = _extract_length(type_column)
-    
+    # Determine the column to check based on the context, switching to CHECK_FIELD_TYPE if empty
+    type_column = df[f'{context}_TIPO_DE_DATO'].fillna('')
+    type_column = type_column.where(type_column != '', df['CHECK_FIELD_TYPE'].fillna(''))
+
+    # Evaluate the type rules in order, the first one that matches sets the data type
+    conditions = [
+        type_column.str.contains('VARCHAR2', regex=False),
+        type_column == 'TIMESTAMP',
+        type_column == 'DATE',
+        type_column.str.contains('NUMBER', regex=False),
+        type_column.str.contains('FLOAT', regex=False)
+    ]
+    data_type = pd.Series(np.select(conditions, ['string', 'timestamp', 'string', 'int', 'float'], default=''),
+                          index=df.index, dtype=object)
+    data_type = data_type.mask(data_type == '')
+
+    char_length = pd.Series(np.nan, index=df.index, dtype=object)
+    number_length = pd.Series(np.nan, index=df.index, dtype=object)
+    if context == 'LANDING':
+        rule = np.select(conditions, range(len(conditions)), default=-1)
+        lengths = _extract_lengths(type_column)
+        char_length = lengths.where(rule == 0)
+        number_length = lengths.where(np.isin(rule, [3, 4]))
+
     return data_type, char_length, number_length
 
 
-def _extract_length(type_string: str):
+def _extract_lengths(type_column: pd.Series):
     """
-    Extract the length from a data type string, if available.
+    Extract the length from the data type strings, if available.
 
     Parameters:
-        type_string (str): The data type string to extract length from.
+        type_column (pd.Series): The data type strings to extract length from.
 
     Returns:
-        str: The extracted length, or NaN if not available.
+        pd.Series: The extracted lengths, or NaN if not available.
     """
-    if '(' in type_string and ')' in type_string:
-        return type_string.split('(')[1].strip(')')
-    return np.nan
+    has_length = type_column.str.contains('(', regex=False) & type_column.str.contains(')', regex=False)
+    return type_column.str.split('(').str[1].str.strip(')').where(has_length)
 
 
 def _add_records(df: pd.DataFrame, legacy: str, table: str):
@@ -0,0 +1,91 @@
+import os
+import re
+from logger import logger
+from config import config
+
+# HSU_<legacy>_Linaje_de_datos vXX.X.xlsx, the version can have any number of parts (v1.10, v2.0.1)
+_LINEAGE_FILE_PATTERN = re.compile(r'^HSU_(?P<legacy>[A-Z0-9]+)_.*v(?P<version>[0-9]+(?:\.[0-9]+)*)\.xls[xm]$', re.IGNORECASE)
+_INDEX = None
+
+
+class LineageIndex:
+    '''
+        Index of the lineage files of the input folder, built with a single scan of the folder.
+        The versions are compared as tuples of integers, so v1.10 is newer than v1.9. The
+        files that do not follow the name format, like the lock files of Excel, are ignored.
+        Parameters:
+            folder (str): Path to the lineage folder.
+    '''
+    def __init__(self, folder: str):
+        self.folder = folder
+        self.mtime = os.stat(folder).st_mtime_ns
+
+        logger.debug(f'Indexing lineage folder {folder}')
+        self._versions = {}
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                match = _LINEAGE_FILE_PATTERN.match(entry.name)
+                if match is None or not entry.is_file():
+                    logger.debug(f'Ignoring {entry.name}, it is not a versioned lineage file')
+                    continue
+                version = tuple(int(part) for part in match.group('version').split('.'))
+                self._versions.setdefault(match.group('legacy').upper(), []).append((version, entry.name))
+
+        for legacy, versions in self._versions.items():
+            # Sort by version, and by name for the files with the same version (v1.2 and v1.02)
+            versions.sort()
+            if len(versions) > 1 and versions[-1][0] == versions[-2][0]:
+                logger.warning(f'More than one lineage of {legacy} with version {_format_version(versions[-1][0])}, '
+                               f'using {versions[-1][1]}')
+
+    def get_versions(self, legacy: str):
+        '''
+            Function to get the lineage files of a legacy.
+            Parameters:
+                legacy (str): Legacy name
+            Returns:
+                list: (version, file name) of each lineage file, from the oldest to the newest version
+        '''
+        return list(self._versions.get(legacy.upper(), []))
+
+    def get_last(self, legacy: str):
+        '''
+            Function to get the lineage file with the latest version of a legacy.
+            Parameters:
+                legacy (str): Legacy name
+            Returns:
+                str: File name of the latest lineage, or None if the legacy has no lineage
+        '''
+        versions = self._versions.get(legacy.upper())
+        if not versions:
+            return None
+
+        logger.debug(f'Got the last version: {_format_version(versions[-1][0])}')
+        return versions[-1][1]
+
+
+def get_lineage_index():
+    '''
+        Function to get the lineage index, scanning the folder only the first time or when
+        a file has been added, removed or renamed in it.
+        Returns:
+            LineageIndex: Index of the lineage folder
+    '''
+    global _INDEX
+
+    folder = config.getpath('folders', 'lineaje_folder')
+    if _INDEX is None or _INDEX.folder != folder or _INDEX.mtime != os.stat(folder).st_mtime_ns:
+        _INDEX = LineageIndex(folder)
+
+    return _INDEX
+
+
+def _format_version(version: tuple):
+    '''
+        Function to format a version tuple as it is written in the file names.
+        Parameters:
+            version (tuple): Version parts
+        Returns:
+            str: Version with the parts separated by dots
+    '''
+    return '.'.join(str(part) for part in version)
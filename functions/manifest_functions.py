@@ -0,0 +1,136 @@
+import hashlib
+import json
+import os
+import pandas as pd
+from logger import logger
+from config import config
+
+# Increase it when the output format changes, so every table is generated again
+_MANIFEST_VERSION = 3
+
+
+def get_table_key(generator: str, schema: str, legacy_view: str):
+    '''
+        Function to get the key of a table of a generator in the manifest.
+        Parameters:
+            generator (str): Generator name (dmstask, government or dataquality)
+            schema (str): Schema name
+            legacy_view (str): Legacy view name, as it is in the master file
+        Returns:
+            str: Key of the table in the manifest
+    '''
+    return f'{generator}/{schema}/{legacy_view}'
+
+
+def get_fingerprint(df: pd.DataFrame, config_keys: list = ()):
+    '''
+        Function to calculate the fingerprint of the inputs of an output table.
+        Parameters:
+            df (pd.DataFrame): Master fields of the table joined with their lineage rows
+            config_keys (list): (section, option) of the config values used to generate the table
+        Returns:
+            str: sha256 hex digest of the columns, rows and config values
+    '''
+    fingerprint = hashlib.sha256(f'v{_MANIFEST_VERSION}'.encode())
+    fingerprint.update(json.dumps([str(column) for column in df.columns]).encode())
+    fingerprint.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    for section, option in config_keys:
+        fingerprint.update(f'{section}.{option}={config.get(section, option, fallback="")}'.encode())
+
+    return fingerprint.hexdigest()
+
+
+def is_unchanged(manifest: dict, key: str, fingerprint: str, output, generator: str):
+    '''
+        Function to check if a table can be skipped because its outputs are up to date.
+        Parameters:
+            manifest (dict): Tables of the previous manifest of the legacy
+            key (str): Key of the table in the manifest
+            fingerprint (str): Fingerprint of the current inputs of the table
+            output (LegacyOutput): Staged outputs of the legacy, with the current outputs
+            generator (str): Generator name
+        Returns:
+            bool: True if the fingerprint did not change and all the outputs still exist
+    '''
+    entry = manifest.get(key)
+    if entry is None or entry['fingerprint'] != fingerprint:
+        return False
+
+    return all(output.has_file(generator, path) for path in entry['files'])
+
+
+def create_entry(fingerprint: str, files: list):
+    '''
+        Function to create the manifest entry of a generated table.
+        Parameters:
+            fingerprint (str): Fingerprint of the inputs of the table
+            files (list): Paths of the files written for the table, relative to the legacy folder
+        Returns:
+            dict: Manifest entry of the table
+    '''
+    return {'fingerprint': fingerprint, 'files': files}
+
+
+def load_manifest(legacy: str, generation: str):
+    '''
+        Function to read the manifest of the last run of a legacy.
+        Parameters:
+            legacy (str): Legacy name
+            generation (str): Generation of the current outputs of the legacy
+        Returns:
+            dict: Tables of the manifest, or None if there is no valid manifest for the current outputs
+    '''
+    path = _get_manifest_path(legacy)
+    if generation is None or not os.path.exists(path):
+        logger.debug(f'No manifest found for {legacy}')
+        return None
+
+    try:
+        with open(path, 'r') as fp:
+            manifest = json.load(fp)
+    except Exception as err:
+        logger.warning(f'Error reading manifest {path}, ignoring it: {err}')
+        return None
+
+    if manifest.get('version') != _MANIFEST_VERSION:
+        logger.info(f'Manifest of {legacy} has an old version, regenerating all the tables')
+        return None
+    if manifest.get('generation') != generation:
+        logger.info(f'Manifest of {legacy} does not match its current outputs, regenerating all the tables')
+        return None
+
+    return manifest['tables']
+
+
+def save_manifest(legacy: str, generation: str, tasks: list):
+    '''
+        Function to save the manifest of a legacy with the tables generated in this run.
+        Parameters:
+            legacy (str): Legacy name
+            generation (str): Generation of the outputs written in this run
+            tasks (list): (name, future) of the generators, the result of each one is a dict
+                with the manifest entries of its tables
+    '''
+    tables = {}
+    for _, future in tasks:
+        tables.update(future.result())
+
+    path = _get_manifest_path(legacy)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Write to a temporary file first so the manifest is never left partially written
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w') as fp:
+        json.dump({'version': _MANIFEST_VERSION, 'generation': generation, 'tables': tables}, fp, indent=4, sort_keys=True)
+    os.replace(tmp_path, path)
+    logger.debug(f'Manifest of {legacy} saved with {len(tables)} tables')
+
+
+def _get_manifest_path(legacy: str):
+    '''
+        Function to get the path of the manifest of a legacy.
+        Parameters:
+            legacy (str): Legacy name
+        Returns:
+            str: Path of the manifest
+    '''
+    return os.path.join(config.getpath('folders', 'manifest_folder', fallback='outputs/manifests'), f'{legacy}.json')
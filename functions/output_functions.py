@@ -0,0 +1,524 @@
+import hashlib
+import io
+import itertools
+import json
+import os
+import shutil
+import tarfile
+import threading
+import time
+import zipfile
+from logger import logger
+from config import config
+from functions.generic_functions import create_folder, delete_folder
+
+_GENERATOR_FOLDERS = {
+    'dmstask': 'dmstask_output_folder',
+    'government': 'government_output_folder',
+    'dataquality': 'dataquality_output_folder'
+}
+# Sequence of the generations created by this process, so two runs in the same second never collide
+_GENERATION_COUNTER = itertools.count()
+# Extension of the archive of each archive backend, and mode to open it for writing
+_ARCHIVE_FORMATS = {
+    'zip': ('zip', None),
+    'tar': ('tar', 'w'),
+    'tar.gz': ('tar.gz', 'w:gz')
+}
+_ARCHIVE_MANIFEST = 'MANIFEST.json'
+
+
+class LegacyOutput:
+    '''
+        Staged outputs of a legacy.
+        Every run writes a new generation of the outputs in a hidden folder next to the legacy
+        folder of each generator (.<legacy>.<generation>). The legacy folder is a symbolic link
+        to the current generation, and it is swapped atomically to the new one only when the
+        whole legacy succeeds, so the consumers never see partial outputs. The previous
+        generation is kept for rollback and the older ones are removed.
+        Parameters:
+            legacy (str): Legacy name
+    '''
+    # Every file is written on its own path, so the generators can run in other processes
+    supports_processes = True
+
+    def __init__(self, legacy: str):
+        self.legacy = legacy
+        self.generation = f"{time.strftime('%Y%m%d%H%M%S')}_{os.getpid()}_{next(_GENERATION_COUNTER)}"
+        self._roots = {generator: config.getpath('folders', option) for generator, option in _GENERATOR_FOLDERS.items()}
+
+    def get_current_folder(self, generator: str):
+        '''
+            Function to get the folder with the outputs of the last successful run.
+            Parameters:
+                generator (str): Generator name
+            Returns:
+                str: Path of the legacy folder of the generator
+        '''
+        return f'{self._roots[generator]}/{self.legacy}'
+
+    def get_staging_folder(self, generator: str):
+        '''
+            Function to get the folder where the outputs of this run are written.
+            Parameters:
+                generator (str): Generator name
+            Returns:
+                str: Path of the new generation folder of the generator
+        '''
+        return f'{self._roots[generator]}/.{self.legacy}.{self.generation}'
+
+    def get_current_generation(self):
+        '''
+            Function to get the generation of the current outputs.
+            Returns:
+                str: Generation shared by the legacy folders of all the generators, or None if they
+                    are missing, are not staged folders or belong to different runs
+        '''
+        generations = set()
+        for generator in self._roots:
+            folder = self.get_current_folder(generator)
+            if not os.path.islink(folder):
+                return None
+            generations.add(os.readlink(folder).split('.', 2)[-1])
+
+        return generations.pop() if len(generations) == 1 else None
+
+    def open(self, generator: str, file: str, newline: str = None):
+        '''
+            Function to open a file of the new generation for writing.
+            Parameters:
+                generator (str): Generator name
+                file (str): Path of the file, relative to the legacy folder
+                newline (str): Newline mode of the file, as in the open builtin
+            Returns:
+                file: Text file opened for writing
+        '''
+        path = os.path.join(self.get_staging_folder(generator), file)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return open(path, 'w', newline=newline)
+
+    def write_copies(self, generator: str, files: list, text: str):
+        '''
+            Function to write some files of the new generation with the same content. The content
+            is written once and the rest of the files are hard links to it, or copies if the
+            file system does not support them.
+            Parameters:
+                generator (str): Generator name
+                files (list): Paths of the files, relative to the legacy folder
+                text (str): Content of the files
+        '''
+        with self.open(generator, files[0]) as fp:
+            fp.write(text)
+
+        source = os.path.join(self.get_staging_folder(generator), files[0])
+        for file in files[1:]:
+            path = os.path.join(self.get_staging_folder(generator), file)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            try:
+                os.link(source, path)
+            except OSError:
+                shutil.copy2(source, path)
+
+    def has_file(self, generator: str, file: str):
+        '''
+            Function to check if a file is in the current outputs.
+            Parameters:
+                generator (str): Generator name
+                file (str): Path of the file, relative to the legacy folder
+            Returns:
+                bool: True if the file exists
+        '''
+        return os.path.exists(os.path.join(self.get_current_folder(generator), file))
+
+    def get_files(self):
+        '''
+            Function to list the files of the current outputs.
+            Returns:
+                list: (path, name) of each file, the name is the path relative to the output folder
+                    with / separators (dmstask/<legacy>/<file>)
+        '''
+        output_folder = config.getpath('folders', 'output_folder')
+        files = []
+        for generator, root in self._roots.items():
+            folder = self.get_current_folder(generator)
+            prefix = f'{_get_relative_folder(root, output_folder, generator)}/{self.legacy}'
+            for dirpath, _, filenames in os.walk(folder, followlinks=True):
+                for filename in sorted(filenames):
+                    path = os.path.join(dirpath, filename)
+                    files.append((path, f"{prefix}/{os.path.relpath(path, folder).replace(os.sep, '/')}"))
+
+        return files
+
+    def prepare(self):
+        '''
+            Function to create the staging folders of this run.
+        '''
+        for generator in self._roots:
+            create_folder(self.get_staging_folder(generator))
+
+    def keep(self, generator: str, files: list):
+        '''
+            Function to carry the outputs of an unchanged table over to the new generation.
+            The files are hard linked when possible, so they keep their content and mtime
+            without being copied.
+            Parameters:
+                generator (str): Generator name
+                files (list): Paths of the files, relative to the legacy folder
+        '''
+        for file in files:
+            source = os.path.join(self.get_current_folder(generator), file)
+            target = os.path.join(self.get_staging_folder(generator), file)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            try:
+                os.link(source, target)
+            except OSError:
+                shutil.copy2(source, target)
+
+    def commit(self):
+        '''
+            Function to publish the new generation, swapping the legacy folders to it.
+        '''
+        for generator, root in self._roots.items():
+            current = self.get_current_folder(generator)
+            previous = None
+            if os.path.islink(current):
+                previous = os.readlink(current)
+            elif os.path.isdir(current):
+                # Folder from a run without staging, keep it as the previous generation
+                previous = f'.{self.legacy}.initial'
+                delete_folder(f'{root}/{previous}')
+                os.rename(current, f'{root}/{previous}')
+
+            # Replacing a link with another one is atomic, the consumers see either generation
+            link = f'{root}/.{self.legacy}.{self.generation}.link'
+            os.symlink(f'.{self.legacy}.{self.generation}', link)
+            os.replace(link, current)
+            logger.debug(f'Published generation {self.generation} in {current}')
+
+            self._remove_old_generations(root, [f'.{self.legacy}.{self.generation}', previous])
+
+    def discard(self):
+        '''
+            Function to remove the staging folders of this run, leaving the current outputs as they were.
+        '''
+        for generator in self._roots:
+            delete_folder(self.get_staging_folder(generator))
+
+    def _remove_old_generations(self, root: str, keep: list):
+        '''
+            Function to remove the generations of the legacy older than the previous one.
+            Parameters:
+                root (str): Output folder of the generator
+                keep (list): Folder names of the generations to keep
+        '''
+        for item in os.scandir(root):
+            if item.name.startswith(f'.{self.legacy}.') and item.name not in keep and item.is_dir(follow_symlinks=False):
+                delete_folder(item.path)
+
+
+class LegacyArchive(LegacyOutput):
+    '''
+        Staged outputs of a legacy in a single zip or tar archive.
+        Every file is added to the archive as it is written, with the same layout as the output
+        folders (dmstask/<legacy>/..., government/<legacy>/..., dataquality/<legacy>/...), and
+        the archive ends with a MANIFEST.json with the size and sha256 of every file. The new
+        archive is written next to the current one (<output_folder>/<legacy>.<extension>) and
+        replaces it atomically only when the whole legacy succeeds, the previous one is kept as
+        .<legacy>.previous.<extension>.
+        Parameters:
+            legacy (str): Legacy name
+            archive_format (str): zip, tar or tar.gz
+    '''
+    # The archive is shared by all the generators, so they must run in this process
+    supports_processes = False
+
+    def __init__(self, legacy: str, archive_format: str):
+        super().__init__(legacy)
+        self.archive_format = archive_format
+        extension, self._tar_mode = _ARCHIVE_FORMATS[archive_format]
+        output_folder = config.getpath('folders', 'output_folder')
+        self.path = os.path.join(output_folder, f'{legacy}.{extension}')
+        self._staging_path = os.path.join(output_folder, f'.{legacy}.{self.generation}.{extension}')
+        self._previous_path = os.path.join(output_folder, f'.{legacy}.previous.{extension}')
+        self._prefixes = {
+            generator: f'{_get_relative_folder(root, output_folder, generator)}/{legacy}'
+            for generator, root in self._roots.items()
+        }
+        self._lock = threading.Lock()
+        self._archive = None
+        self._current = None
+        self._current_entries = None
+        self._files = []
+        self._names = set()
+
+    def get_current_generation(self):
+        '''
+            Function to get the generation of the current archive.
+            Returns:
+                str: Generation in the manifest of the current archive, or None if there is no archive
+        '''
+        with self._lock:
+            data = self._read_current(_ARCHIVE_MANIFEST)
+        return None if data is None else json.loads(data).get('generation')
+
+    def open(self, generator: str, file: str, newline: str = None):
+        '''
+            Function to open a file of the new generation for writing. The content is kept in
+            memory and added to the archive when the file is closed.
+            Parameters:
+                generator (str): Generator name
+                file (str): Path of the file, relative to the legacy folder
+                newline (str): Ignored, the files are always written with \\n
+            Returns:
+                file: Text file opened for writing
+        '''
+        return _ArchiveEntry(self, f'{self._prefixes[generator]}/{file}')
+
+    def write_copies(self, generator: str, files: list, text: str):
+        '''
+            Function to write some files of the new generation with the same content. The tar
+            archives store the content once and the rest of the files as hard links to it, the
+            zip archives store every file.
+            Parameters:
+                generator (str): Generator name
+                files (list): Paths of the files, relative to the legacy folder
+                text (str): Content of the files
+        '''
+        data = text.encode()
+        names = [f'{self._prefixes[generator]}/{file}' for file in files]
+        with self._lock:
+            mtime = time.time()
+            self._add(names[0], data, mtime)
+            for name in names[1:]:
+                self._add(name, data, mtime, link=names[0])
+
+    def has_file(self, generator: str, file: str):
+        '''
+            Function to check if a file is in the current archive.
+            Parameters:
+                generator (str): Generator name
+                file (str): Path of the file, relative to the legacy folder
+            Returns:
+                bool: True if the file exists
+        '''
+        with self._lock:
+            self._open_current()
+            return f'{self._prefixes[generator]}/{file}' in self._current_entries
+
+    def get_files(self):
+        '''
+            Function to list the files of the current outputs.
+            Returns:
+                list: (path, name) of the archive, if it exists
+        '''
+        if not os.path.exists(self.path):
+            return []
+        return [(self.path, os.path.basename(self.path))]
+
+    def prepare(self):
+        '''
+            Function to create the archive of this run.
+        '''
+        create_folder(os.path.dirname(self.path))
+        if self._tar_mode is None:
+            self._archive = zipfile.ZipFile(self._staging_path, 'w', compression=zipfile.ZIP_DEFLATED)
+        else:
+            self._archive = tarfile.open(self._staging_path, self._tar_mode)
+
+    def keep(self, generator: str, files: list):
+        '''
+            Function to carry the files of an unchanged table over from the current archive,
+            keeping their content and modification time.
+            Parameters:
+                generator (str): Generator name
+                files (list): Paths of the files, relative to the legacy folder
+        '''
+        with self._lock:
+            for file in files:
+                name = f'{self._prefixes[generator]}/{file}'
+                self._add(name, self._read_current(name), self._current_entries[name], link=self._get_current_link(name))
+
+    def add(self, name: str, data: bytes):
+        '''
+            Function to add a file to the new archive.
+            Parameters:
+                name (str): Path of the file in the archive
+                data (bytes): Content of the file
+        '''
+        with self._lock:
+            self._add(name, data, time.time())
+
+    def commit(self):
+        '''
+            Function to finish the new archive and replace the current one with it.
+        '''
+        manifest = {
+            'legacy': self.legacy,
+            'generation': self.generation,
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'files': self._files
+        }
+        with self._lock:
+            self._add(_ARCHIVE_MANIFEST, json.dumps(manifest, indent=4).encode(), time.time(), in_manifest=False)
+            self._archive.close()
+            self._close_current()
+
+        if os.path.exists(self.path):
+            # Keep the current archive as the previous one without leaving the legacy without archive
+            if os.path.exists(self._previous_path):
+                os.remove(self._previous_path)
+            os.link(self.path, self._previous_path)
+        os.replace(self._staging_path, self.path)
+        logger.debug(f'Published generation {self.generation} in {self.path}')
+
+    def discard(self):
+        '''
+            Function to remove the archive of this run, leaving the current one as it was.
+        '''
+        with self._lock:
+            if self._archive is not None:
+                self._archive.close()
+            self._close_current()
+        if os.path.exists(self._staging_path):
+            os.remove(self._staging_path)
+
+    def _add(self, name: str, data: bytes, mtime: float, in_manifest: bool = True, link: str = None):
+        '''
+            Function to write a file in the new archive, the lock must be held.
+            Parameters:
+                name (str): Path of the file in the archive
+                data (bytes): Content of the file
+                mtime (float): Modification time of the file
+                in_manifest (bool): Add the file to the manifest of the archive
+                link (str): Path of a file already in the archive with the same content, the
+                    tar archives store the file as a hard link to it
+        '''
+        if self._tar_mode is None:
+            info = zipfile.ZipInfo(name, date_time=time.localtime(mtime)[:6])
+            info.compress_type = zipfile.ZIP_DEFLATED
+            info.external_attr = 0o644 << 16
+            self._archive.writestr(info, data)
+        else:
+            info = tarfile.TarInfo(name)
+            info.mtime = mtime
+            info.mode = 0o644
+            if link is None:
+                info.size = len(data)
+                self._archive.addfile(info, io.BytesIO(data))
+            else:
+                info.type = tarfile.LNKTYPE
+                info.linkname = link
+                self._archive.addfile(info)
+
+        self._names.add(name)
+        if in_manifest:
+            self._files.append({'path': name, 'size': len(data), 'sha256': hashlib.sha256(data).hexdigest()})
+
+    def _open_current(self):
+        '''
+            Function to open the current archive for reading, if it exists, the lock must be held.
+        '''
+        if self._current_entries is not None:
+            return
+
+        self._current_entries = {}
+        if not os.path.exists(self.path):
+            return
+        if self._tar_mode is None:
+            self._current = zipfile.ZipFile(self.path, 'r')
+            self._current_entries = {info.filename: time.mktime(info.date_time + (0, 0, -1)) for info in self._current.infolist()}
+        else:
+            self._current = tarfile.open(self.path, 'r:*')
+            self._current_entries = {member.name: member.mtime for member in self._current.getmembers()}
+
+    def _read_current(self, name: str):
+        '''
+            Function to read a file of the current archive, the lock must be held.
+            Parameters:
+                name (str): Path of the file in the archive
+            Returns:
+                bytes: Content of the file, or None if it is not in the archive
+        '''
+        self._open_current()
+        if name not in self._current_entries:
+            return None
+        if self._tar_mode is None:
+            return self._current.read(name)
+        return self._current.extractfile(name).read()
+
+    def _get_current_link(self, name: str):
+        '''
+            Function to get the file a file of the current archive is a hard link to, if it is
+            already in the new archive, the lock must be held.
+            Parameters:
+                name (str): Path of the file in the archive
+            Returns:
+                str: Path of the linked file, or None if the file is not a link or its target is not in the new archive
+        '''
+        if self._tar_mode is None:
+            return None
+        member = self._current.getmember(name)
+        if member.islnk() and member.linkname in self._names:
+            return member.linkname
+        return None
+
+    def _close_current(self):
+        '''
+            Function to close the current archive, the lock must be held.
+        '''
+        if self._current is not None:
+            self._current.close()
+            self._current = None
+
+
+class _ArchiveEntry(io.StringIO):
+    '''
+        Text file that adds its content to an archive when it is closed.
+        Parameters:
+            archive (LegacyArchive): Archive of the file
+            name (str): Path of the file in the archive
+    '''
+    def __init__(self, archive: LegacyArchive, name: str):
+        super().__init__()
+        self._legacy_archive = archive
+        self._name = name
+
+    def close(self):
+        if not self.closed:
+            self._legacy_archive.add(self._name, self.getvalue().encode())
+        super().close()
+
+
+def create_legacy_output(legacy: str):
+    '''
+        Function to create the staged outputs of a legacy for the backend of the config.
+        Parameters:
+            legacy (str): Legacy name
+        Returns:
+            LegacyOutput: Output folders, or a single archive for the zip, tar and tar.gz backends
+        Exceptions:
+            ValueError: Raised if the backend is not valid
+    '''
+    backend = config.get('output', 'backend', fallback='folder').lower()
+    if backend == 'folder':
+        return LegacyOutput(legacy)
+    if backend in _ARCHIVE_FORMATS:
+        return LegacyArchive(legacy, backend)
+    raise ValueError(f'Invalid output backend {backend}, it must be folder, {", ".join(_ARCHIVE_FORMATS)}')
+
+
+def _get_relative_folder(root: str, output_folder: str, generator: str):
+    '''
+        Function to get the folder of a generator relative to the output folder, used to name the
+        files inside the archives and in S3.
+        Parameters:
+            root (str): Output folder of the generator
+            output_folder (str): Main output folder
+            generator (str): Generator name, used if the folder of the generator is not inside the output folder
+        Returns:
+            str: Relative folder of the generator, with / separators
+    '''
+    folder = os.path.relpath(root, output_folder)
+    if folder.startswith('..'):
+        return generator
+    return folder.replace(os.sep, '/')
@@ -0,0 +1,172 @@
+import numpy as np
+import pandas as pd
+from collections import namedtuple
+from logger import logger
+
+JoinRows = namedtuple('JoinRows', [
+    'config_rows',   # Positions of the rows in the config dataframe of the table
+    'lineage_rows'   # Positions of the matching rows in the lineage dataframe, -1 if there is no match
+])
+
+TablePartition = namedtuple('TablePartition', [
+    'legacy_view',         # Legacy view name as it is in the master file (LEGADO_VM_...)
+    'lineage_view',        # Legacy view name with the legacy code, as it is in the lineage
+    'target_table',        # Target table name
+    'config_df',           # Master fields of the table
+    'present_in_lineage',  # For each master field, True if it is a legacy field in the lineage
+    'landing_join',        # JoinRows of the master fields with the lineage by landing field name
+    'legacy_join'          # JoinRows of the master fields with the lineage by legacy field name
+])
+
+
+class LineageProjection:
+    '''
+        Read-only projection of the lineage dataframe on some of its columns.
+        The lineage data is shared and never copied as a whole: the generators can only take
+        rows from the projection, which returns new dataframes with just those rows and columns.
+        Parameters:
+            lineage_df (pd.DataFrame): DataFrame with the lineage information
+            columns (list): Columns of the projection
+    '''
+    def __init__(self, lineage_df: pd.DataFrame, columns: list):
+        self._lineage_df = lineage_df
+        self._column_positions = lineage_df.columns.get_indexer(columns)
+        self.columns = pd.Index(columns)
+
+    def __len__(self):
+        return len(self._lineage_df)
+
+    def take(self, rows: np.ndarray):
+        '''
+            Function to get some rows of the projection.
+            Parameters:
+                rows (np.ndarray): Positions of the rows in the lineage dataframe
+            Returns:
+                pd.DataFrame: New dataframe with the rows and the columns of the projection
+        '''
+        return self._lineage_df.iloc[rows, self._column_positions]
+
+
+def partition_tables(config_df: pd.DataFrame, lineage_df: pd.DataFrame, legacy: str):
+    '''
+        Function to join the config and lineage dataframes and split them by legacy table.
+        The legacy view names are normalized once, the join of the master fields with the
+        lineage by landing and by legacy field name is calculated once for the whole schema,
+        and everything is grouped by table in a single pass.
+        The partitions are read-only and the joins are kept as row positions, so every
+        generator can build them from its own projection of the lineage dataframe.
+        Parameters:
+            config_df (pd.DataFrame): DataFrame with the configuration information
+            lineage_df (pd.DataFrame): DataFrame with the lineage information
+            legacy (str): Legacy name
+        Returns:
+            list: List of TablePartition, in the order of the master file
+    '''
+    logger.debug(f'Joining and partitioning config and lineage by legacy table for {legacy}')
+    lineage_views = config_df['LEGACY_VIEW'].str.replace('LEGADO', legacy.upper()).to_numpy()
+    table_groups = config_df.groupby('LEGACY_VIEW', sort=False)
+    table_ids = table_groups.ngroup().to_numpy()
+    # Position of each config row inside its table
+    table_rows = table_groups.cumcount().to_numpy()
+
+    landing_join = _get_join_rows(lineage_views, config_df['FIELD_NAME'], lineage_df, 'LANDING_NOMBRE_CAMPO')
+    legacy_join = _get_join_rows(lineage_views, config_df['FIELD_NAME'], lineage_df, 'LEGACY_NOMBRE_CAMPO')
+
+    present_in_lineage = np.zeros(len(config_df), dtype=bool)
+    present_in_lineage[legacy_join['CONFIG_ROW'].to_numpy()[legacy_join['LINEAGE_ROW'].to_numpy() >= 0]] = True
+
+    landing_groups = landing_join.groupby(table_ids[landing_join['CONFIG_ROW']]).indices
+    legacy_groups = legacy_join.groupby(table_ids[legacy_join['CONFIG_ROW']]).indices
+
+    partitions = []
+    for table_id, (legacy_view, config_rows) in enumerate(table_groups.indices.items()):
+        partitions.append(TablePartition(
+            legacy_view=legacy_view,
+            lineage_view=lineage_views[config_rows[0]],
+            target_table=config_df['TARGET_TABLE'].iloc[config_rows[0]],
+            config_df=config_df.iloc[config_rows].reset_index(drop=True),
+            present_in_lineage=_read_only(present_in_lineage[config_rows]),
+            landing_join=_get_table_join(landing_join, landing_groups[table_id], table_rows),
+            legacy_join=_get_table_join(legacy_join, legacy_groups[table_id], table_rows)
+        ))
+
+    return partitions
+
+
+def join_lineage(config_df: pd.DataFrame, lineage: LineageProjection, join: JoinRows):
+    '''
+        Function to build the join of the master fields of a table with the lineage, as a
+        left merge would do.
+        Parameters:
+            config_df (pd.DataFrame): Master fields of the table
+            lineage (LineageProjection): Projection of the lineage with the columns to join
+            join (JoinRows): Row positions of the join
+        Returns:
+            pd.DataFrame: Dataframe with the master fields columns followed by the lineage columns,
+                with NaN in the lineage columns for the fields without match
+    '''
+    config_join_df = config_df.take(join.config_rows).reset_index(drop=True)
+
+    # Take the matching lineage rows and leave NaN rows for the fields without match
+    matched = join.lineage_rows >= 0
+    lineage_join_df = lineage.take(join.lineage_rows[matched]).set_axis(np.flatnonzero(matched), axis=0)
+    lineage_join_df = lineage_join_df.reindex(np.arange(len(matched)))
+
+    return pd.concat([config_join_df, lineage_join_df], axis=1)
+
+
+def _get_join_rows(lineage_views: np.ndarray, field_names: pd.Series, lineage_df: pd.DataFrame, field_column: str):
+    '''
+        Function to calculate the rows of a left join of the master fields with the lineage
+        by (view, field) keys.
+        Parameters:
+            lineage_views (np.ndarray): Normalized legacy view name of each master field
+            field_names (pd.Series): Name of each master field
+            lineage_df (pd.DataFrame): DataFrame with the lineage information
+            field_column (str): Lineage column with the field name to join with
+        Returns:
+            pd.DataFrame: Dataframe with the CONFIG_ROW and LINEAGE_ROW positions of the join
+    '''
+    config_keys = pd.DataFrame({
+        'VIEW': lineage_views,
+        'FIELD': field_names.to_numpy(),
+        'CONFIG_ROW': np.arange(len(field_names))
+    })
+    lineage_keys = pd.DataFrame({
+        'VIEW': lineage_df['LEGACY_NOMBRE_VISTA'].to_numpy(),
+        'FIELD': lineage_df[field_column].to_numpy(),
+        'LINEAGE_ROW': np.arange(len(lineage_df))
+    })
+
+    join_df = pd.merge(config_keys, lineage_keys, on=['VIEW', 'FIELD'], how='left')
+    join_df['LINEAGE_ROW'] = join_df['LINEAGE_ROW'].fillna(-1).astype(np.intp)
+
+    return join_df[['CONFIG_ROW', 'LINEAGE_ROW']]
+
+
+def _get_table_join(join_df: pd.DataFrame, join_rows: np.ndarray, table_rows: np.ndarray):
+    '''
+        Function to get the part of a join that belongs to a table.
+        Parameters:
+            join_df (pd.DataFrame): Join rows of the whole schema
+            join_rows (np.ndarray): Positions in the join of the rows of the table
+            table_rows (np.ndarray): Position inside the table of each config row
+        Returns:
+            JoinRows: Row positions of the join of the table
+    '''
+    return JoinRows(
+        config_rows=_read_only(table_rows[join_df['CONFIG_ROW'].to_numpy()[join_rows]]),
+        lineage_rows=_read_only(join_df['LINEAGE_ROW'].to_numpy()[join_rows])
+    )
+
+
+def _read_only(array: np.ndarray):
+    '''
+        Function to mark an array as read-only, so it can be shared safely between generators.
+        Parameters:
+            array (np.ndarray): Array to protect
+        Returns:
+            np.ndarray: The same array, not writeable
+    '''
+    array.flags.writeable = False
+    return array
@@ -0,0 +1,252 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from logger import logger, configure_logging
+from config import config
+from functions.dmstasks_functions import generate_dmstask
+from functions.government_tables_functions import generate_government_tables
+from functions.dataquality_functions import generate_dataquality
+from functions.catalog_functions import get_master_field_catalog
+from functions.lineage_index_functions import get_lineage_index
+from functions.partition_functions import LineageProjection, partition_tables
+from functions.execution_functions import create_executor, submit_task, collect_errors
+from functions.manifest_functions import load_manifest, save_manifest
+from functions.output_functions import LegacyOutput, create_legacy_output
+from functions.s3_functions import is_upload_active, upload_outputs
+from functions.profile_functions import start_profiling, stop_profiling, is_profiling, span, profiled
+from functions.generic_functions import (
+    create_folder_structure,
+    get_last_lineage_file,
+    parse_lineage_excel,
+    LineageWorkbook,
+    get_config
+)
+
+
+def run_legacies(legacies: list, workers: int, profile: bool = None):
+    """
+        Process a list of legacies, in parallel when more than one worker is available.
+
+        Parameters:
+            legacies (list): Legacy names to be processed.
+            workers (int): Maximum number of processes used to run the legacies.
+            profile (bool): None to run without profiling, otherwise profile each legacy and
+                also collect its cProfile if True.
+
+        Returns:
+            list: One result dictionary per legacy, in the same order as the input list.
+    """
+    workers = min(workers, len(legacies))
+    if workers <= 1:
+        return [process_legacy(legacy, profile) for legacy in legacies]
+
+    logger.info(f'Processing {len(legacies)} legacies with {workers} workers')
+    # Load the master fields and index the lineages before starting the pool, so forked workers inherit them
+    get_master_field_catalog()
+    get_lineage_index()
+    with ProcessPoolExecutor(max_workers=workers, initializer=configure_logging) as executor:
+        return list(executor.map(partial(process_legacy, profile=profile), legacies))
+
+
+def get_available_legacies(legacies: list):
+    """
+        Keep only the legacies that have a lineage in the input folder, for the --all option.
+
+        Parameters:
+            legacies (list): Legacy names.
+
+        Returns:
+            list: Legacies with a lineage, in the same order. All of them if the lineage folder
+                can not be read, so the error is reported for each legacy.
+    """
+    try:
+        lineage_index = get_lineage_index()
+    except OSError as err:
+        logger.error(f'Error reading the lineage folder: {err}')
+        return legacies
+
+    available = [legacy for legacy in legacies if lineage_index.get_last(legacy) is not None]
+    skipped = [legacy for legacy in legacies if legacy not in available]
+    if skipped:
+        logger.info(f'Skipping the legacies without lineage: {", ".join(skipped)}')
+    return available
+
+
+def process_legacy(legacy: str, profile: bool = None):
+    """
+        Generate all the files for a legacy, processing the RUU and RUSS schemas.
+
+        Parameters:
+            legacy (str): The legacy to be processed.
+            profile (bool): None to run without profiling, otherwise profile the legacy and also
+                collect its cProfile if True.
+
+        Returns:
+            dict: Result of the legacy with its status, processed schemas, elapsed time and errors.
+
+        Errors are logged and returned in the result instead of being raised, so a failing legacy
+        does not stop the rest of the batch. The generators run in the executor configured in the
+        execution section, so the RUSS schema is prepared while the RUU generators are running.
+        When the legacy is profiled the generators run serially, so their spans do not overlap.
+        Only the tables whose inputs changed since the last run are written, following the manifest
+        of the legacy. The outputs are written in a new generation that replaces the current one
+        only if the whole legacy succeeds.
+    """
+    logger.info(f'Processing legacy {legacy}')
+    start_time = time.perf_counter()
+    result = {'legacy': legacy, 'status': 'OK', 'schemas': [], 'elapsed': 0.0, 'errors': []}
+
+    if profile is not None:
+        start_profiling(legacy, profile)
+
+    tasks = []
+    output = None
+    try:
+        with span('process_legacy'):
+            create_folder_structure(legacy)
+            output = create_legacy_output(legacy)
+            output.prepare()
+            manifest = load_manifest(legacy, output.get_current_generation()) or {}
+            with span('get_last_lineage_file'):
+                lineage_excel_path = get_last_lineage_file(legacy)
+            executor_mode = 'serial' if is_profiling() else None
+            with LineageWorkbook(lineage_excel_path) as workbook, create_executor(executor_mode, output.supports_processes) as executor:
+                for schema in ['ruu', 'russ']:
+                    schema_tasks = process_schema(schema, legacy, workbook, executor, manifest, output)
+                    if schema_tasks is not None:
+                        result['schemas'].append(schema)
+                        tasks.extend(schema_tasks)
+    except Exception as err:
+        logger.error(f'Error processing {legacy}: {err}')
+        result['errors'].append(str(err))
+
+    # The executor waits for the submitted generators on exit, so they are all finished here
+    result['errors'].extend(collect_errors(tasks))
+    if output is not None:
+        with span('publish_outputs'):
+            _publish_outputs(legacy, output, tasks, result)
+        if not result['errors']:
+            with span('upload_outputs'):
+                _upload_outputs(legacy, output, result)
+
+    result['profile'] = stop_profiling()
+    if result['errors']:
+        result['status'] = 'ERROR'
+    result['elapsed'] = time.perf_counter() - start_time
+    return result
+
+
+def _publish_outputs(legacy: str, output: LegacyOutput, tasks: list, result: dict):
+    """
+        Publish the new generation of the outputs of a legacy, or discard it if the legacy failed.
+
+        Parameters:
+            legacy (str): The legacy being processed.
+            output (LegacyOutput): Staged outputs of the legacy.
+            tasks (list): (name, future) of the generators of the legacy.
+            result (dict): Result of the legacy, the errors publishing the outputs are added to it.
+
+        The manifest is saved before the swap, so if the swap does not finish the manifest does not
+        match the current generation and the next run generates everything again.
+    """
+    try:
+        if result['errors']:
+            logger.info(f'Discarding the outputs of {legacy}, the current ones are kept')
+            output.discard()
+            return
+        save_manifest(legacy, output.generation, tasks)
+        output.commit()
+    except Exception as err:
+        logger.error(f'Error publishing the outputs of {legacy}: {err}')
+        result['errors'].append(str(err))
+
+
+def _upload_outputs(legacy: str, output: LegacyOutput, result: dict):
+    """
+        Upload the published outputs of a legacy to S3, if the upload is active in the config.
+
+        Parameters:
+            legacy (str): The legacy being processed.
+            output (LegacyOutput): Published outputs of the legacy.
+            result (dict): Result of the legacy, the errors uploading the outputs are added to it.
+    """
+    try:
+        if is_upload_active():
+            upload_outputs(legacy, output)
+    except Exception as err:
+        logger.error(f'Error uploading the outputs of {legacy}: {err}')
+        result['errors'].append(str(err))
+
+
+def log_summary(results: list):
+    """
+        Log a combined summary for all the processed legacies.
+
+        Parameters:
+            results (list): Result dictionaries returned by process_legacy.
+    """
+    logger.info('Summary:')
+    for result in results:
+        schemas = ', '.join(result['schemas']) or '-'
+        message = f"{result['legacy']}: {result['status']} - schemas: {schemas} - {result['elapsed']:.2f}s"
+        logger.info(message)
+        for error in result['errors']:
+            logger.info(f'    {error}')
+
+    processed = sum(1 for result in results if result['status'] == 'OK')
+    logger.info(f'{processed}/{len(results)} legacies processed successfully.')
+
+
+def process_schema(schema, legacy, workbook, executor, manifest, output):
+    """
+        Process the given schema to extract configuration and lineage data, and generate government tables.
+
+        Parameters:
+            schema (str): The name of the schema to be processed.
+            legacy (str): The legacy being processed.
+            workbook (LineageWorkbook): The lineage workbook, opened once and shared by both schemas.
+            executor (Executor): Executor where the generators are submitted, None to run them right away.
+            manifest (dict): Tables of the previous manifest of the legacy, to skip the unchanged ones.
+            output (LegacyOutput): Staged outputs of the legacy, where the generators write.
+
+        Returns:
+            list: (name, future) of each generator submitted, or None if no lineage was found.
+
+        This function retrieves configuration data for the schema, parses the lineage Excel to
+        obtain lineage information, and checks for data availability.
+        If lineage data is present, it generates government tables using the relevant lineage and
+        configuration data.
+    """
+    logger.info(f'Processing schema {schema}')
+    with span('get_config', schema):
+        config_df = get_config(schema)
+    with span('parse_lineage_excel', schema):
+        lineage_df = parse_lineage_excel(legacy, workbook, schema)
+
+    if lineage_df.empty:
+        logger.info(f'No lineage found for {legacy} in {schema}')
+        return None
+
+    # Join config and lineage and split them by legacy table once for all the generators
+    with span('partition_tables', schema):
+        partitions = partition_tables(config_df, lineage_df, legacy)
+    tasks = []
+
+    # Dmstask files
+    if config.getboolean('dmstask', 'active', fallback=False):
+        logger.info(f'Generating dmstask files for {legacy} in {schema}')
+        tasks.append((f'dmstask/{schema}', submit_task(executor, profiled(generate_dmstask, schema), partitions, legacy, schema, manifest, output)))
+
+    # Generate government tables files
+    if config.getboolean('government', 'active', fallback=False):
+        logger.info(f'Generating government tables files for {legacy} in {schema}')
+        government_lineage = LineageProjection(lineage_df, [lineage_df.columns[0], *lineage_df.columns[5:]])
+        tasks.append((f'government/{schema}', submit_task(executor, profiled(generate_government_tables, schema), government_lineage, partitions, legacy, schema, manifest, output)))
+
+    # DataQuality files
+    if config.getboolean('dataquality', 'active', fallback=False):
+        logger.info(f'Generating DataQuality files for {legacy} in {schema}')
+        dataquality_lineage = LineageProjection(lineage_df, [*lineage_df.columns[0:2], lineage_df.columns[4]])
+        tasks.append((f'dataquality/{schema}', submit_task(executor, profiled(generate_dataquality, schema), dataquality_lineage, partitions, legacy, schema, manifest, output)))
+
+    return tasks
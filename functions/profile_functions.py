@@ -0,0 +1,203 @@
+import cProfile
+import json
+import os
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+from logger import logger
+from config import config
+
+_PROFILER = None
+
+
+class Profiler:
+    '''
+        Timing spans of the run of a legacy.
+        Each span records its wall time, the CPU time of the thread that runs it and the peak of
+        the memory traced by tracemalloc while it was open. The spans can be nested, the peak of
+        a span includes the peaks of the spans inside it.
+        Parameters:
+            legacy (str): Legacy name
+            cprofile (bool): Also collect a cProfile of the whole run
+            trace_memory (bool): Trace the memory peaks, it slows down the run; without it the peaks are 0
+    '''
+    def __init__(self, legacy: str, cprofile: bool = False, trace_memory: bool = True):
+        self.legacy = legacy
+        self.trace_memory = trace_memory
+        self.spans = []
+        self._stack = []
+        self._cprofile = cProfile.Profile() if cprofile else None
+
+    def start(self):
+        '''
+            Function to start tracing the memory and, if requested, the cProfile.
+        '''
+        if self.trace_memory:
+            tracemalloc.start()
+        if self._cprofile is not None:
+            self._cprofile.enable()
+
+    def stop(self):
+        '''
+            Function to stop tracing the memory and the cProfile.
+        '''
+        if self._cprofile is not None:
+            self._cprofile.disable()
+        if self.trace_memory:
+            tracemalloc.stop()
+
+    @contextmanager
+    def span(self, name: str, schema: str = None):
+        '''
+            Function to measure a block of code.
+            Parameters:
+                name (str): Span name
+                schema (str): Schema the span belongs to, if any
+        '''
+        _, peak = tracemalloc.get_traced_memory()
+        if self._stack:
+            # Keep the peak reached so far for the parent span before resetting it
+            self._stack[-1]['peak'] = max(self._stack[-1]['peak'], peak)
+        tracemalloc.reset_peak()
+        frame = {'peak': 0}
+        self._stack.append(frame)
+
+        start_wall = time.perf_counter()
+        start_cpu = time.thread_time()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - start_wall
+            cpu = time.thread_time() - start_cpu
+            _, peak = tracemalloc.get_traced_memory()
+            self._stack.pop()
+            peak = max(frame['peak'], peak)
+            if self._stack:
+                self._stack[-1]['peak'] = max(self._stack[-1]['peak'], peak)
+
+            self.spans.append({
+                'name': name,
+                'schema': schema,
+                'wall_seconds': round(wall, 6),
+                'cpu_seconds': round(cpu, 6),
+                'peak_memory_mb': round(peak / (1024 * 1024), 3)
+            })
+
+    def get_report(self):
+        '''
+            Function to build the report of the spans.
+            Returns:
+                dict: Spans in the order they finished, and the same spans grouped by schema
+        '''
+        schemas = {}
+        for span in self.spans:
+            schemas.setdefault(span['schema'] or 'legacy', {})[span['name']] = {
+                key: value for key, value in span.items() if key not in ('name', 'schema')
+            }
+
+        return {
+            'legacy': self.legacy,
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'spans': self.spans,
+            'schemas': schemas
+        }
+
+    def save(self):
+        '''
+            Function to save the report, and the cProfile stats if they were collected.
+            Returns:
+                str: Path of the report
+        '''
+        folder = config.getpath('folders', 'profile_folder', fallback='profiles')
+        os.makedirs(folder, exist_ok=True)
+        name = f"{self.legacy}_{time.strftime('%Y%m%d%H%M%S')}_{os.getpid()}"
+        path = os.path.join(folder, f'{name}.json')
+        with open(path, 'w') as fp:
+            json.dump(self.get_report(), fp, indent=4)
+
+        if self._cprofile is not None:
+            self._cprofile.dump_stats(os.path.join(folder, f'{name}.prof'))
+
+        return path
+
+
+def start_profiling(legacy: str, cprofile: bool = False):
+    '''
+        Function to start profiling the run of a legacy in this process.
+        Parameters:
+            legacy (str): Legacy name
+            cprofile (bool): Also collect a cProfile of the run
+    '''
+    global _PROFILER
+
+    _PROFILER = Profiler(legacy, cprofile, config.getboolean('profile', 'trace_memory', fallback=True))
+    _PROFILER.start()
+
+
+def stop_profiling():
+    '''
+        Function to stop profiling, log the spans and save the report.
+        Returns:
+            dict: Report of the spans, or None if the run was not being profiled
+    '''
+    global _PROFILER
+
+    if _PROFILER is None:
+        return None
+
+    profiler, _PROFILER = _PROFILER, None
+    profiler.stop()
+    logger.info(f'Profile of {profiler.legacy}:')
+    for span in profiler.spans:
+        schema = f" ({span['schema']})" if span['schema'] else ''
+        logger.info(f"    {span['name']}{schema}: wall {span['wall_seconds']:.3f}s - cpu {span['cpu_seconds']:.3f}s"
+                    f" - peak {span['peak_memory_mb']:.1f}MB")
+    logger.info(f'Profile saved in {profiler.save()}')
+
+    return profiler.get_report()
+
+
+def is_profiling():
+    '''
+        Function to check if the run is being profiled.
+        Returns:
+            bool: True if there is an active profiler in this process
+    '''
+    return _PROFILER is not None
+
+
+def span(name: str, schema: str = None):
+    '''
+        Function to measure a block of code if the run is being profiled.
+        Parameters:
+            name (str): Span name
+            schema (str): Schema the span belongs to, if any
+        Returns:
+            contextmanager: Span of the active profiler, or a context that does nothing
+    '''
+    if _PROFILER is None:
+        return nullcontext()
+    return _PROFILER.span(name, schema)
+
+
+def profiled(function, schema: str = None):
+    '''
+        Function to measure every call of a function in a span named after it, if the run is
+        being profiled.
+        Parameters:
+            function (callable): Function to measure
+            schema (str): Schema the calls belong to, if any
+        Returns:
+            callable: The function itself when there is no active profiler, so it can still be
+                sent to a process pool
+    '''
+    if _PROFILER is None:
+        return function
+
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        with span(function.__name__, schema):
+            return function(*args, **kwargs)
+
+    return wrapper
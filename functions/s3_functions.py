@@ -0,0 +1,166 @@
+import hashlib
+import math
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from logger import logger
+from config import config
+
+_MB = 1024 * 1024
+# Client shared by all the uploads of this process, boto3 clients are thread safe
+_CLIENT = None
+_CLIENT_LOCK = threading.Lock()
+
+try:
+    import boto3
+    from boto3.s3.transfer import TransferConfig
+    from botocore.config import Config
+    from s3transfer.utils import ChunksizeAdjuster
+    _BOTO3_AVAILABLE = True
+except ImportError:
+    _BOTO3_AVAILABLE = False
+
+
+def is_upload_active():
+    '''
+        Function to check if the outputs must be uploaded to S3.
+        Returns:
+            bool: True if the upload is active in the config
+        Exceptions:
+            ImportError: Raised if the upload is active but boto3 is not installed
+    '''
+    if not config.getboolean('s3', 'active', fallback=False):
+        return False
+    if not _BOTO3_AVAILABLE:
+        raise ImportError('The S3 upload is active but boto3 is not installed')
+    return True
+
+
+def upload_outputs(legacy: str, output):
+    '''
+        Function to upload the current outputs of a legacy to S3.
+        The files are uploaded in parallel with the client of the process, the big ones in
+        multipart uploads, and the ones whose ETag matches the object in S3 are skipped.
+        Parameters:
+            legacy (str): Legacy name
+            output (LegacyOutput): Outputs of the legacy, already published
+        Returns:
+            dict: Number of files uploaded and skipped
+    '''
+    bucket = config.get('s3', 'bucket')
+    prefix = config.get('s3', 'prefix', fallback='').strip('/')
+    workers = config.getint('s3', 'workers', fallback=16)
+    multipart_threshold = config.getint('s3', 'multipart_threshold_mb', fallback=8) * _MB
+    chunk_size = config.getint('s3', 'multipart_chunksize_mb', fallback=8) * _MB
+    transfer_config = TransferConfig(
+        multipart_threshold=multipart_threshold,
+        multipart_chunksize=chunk_size,
+        # The files are already uploaded in parallel, the parts of each one are uploaded in order
+        use_threads=False
+    )
+
+    files = [(path, f'{prefix}/{name}' if prefix else name) for path, name in output.get_files()]
+    remote_etags = _get_remote_etags(bucket, {key for _, key in files})
+    pending = [
+        (path, key) for path, key in files
+        if remote_etags.get(key) != get_etag(path, multipart_threshold, chunk_size)
+    ]
+
+    logger.info(f'Uploading {len(pending)} files of {legacy} to s3://{bucket}/{prefix}, '
+                f'{len(files) - len(pending)} unchanged')
+    client = _get_client()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # list forces every upload to finish and raises the first error
+        list(executor.map(lambda item: client.upload_file(item[0], bucket, item[1], Config=transfer_config), pending))
+
+    return {'uploaded': len(pending), 'skipped': len(files) - len(pending)}
+
+
+def get_etag(file_path: str, multipart_threshold: int, chunk_size: int):
+    '''
+        Function to calculate the ETag S3 gives to a file uploaded with the transfer config.
+        The files smaller than the threshold are uploaded in one request, the rest in a multipart
+        upload even if it has only one part. The chunk size is adjusted as the transfer does, to
+        the minimum part size of S3 and the maximum number of parts.
+        Parameters:
+            file_path (str): Path to the file
+            multipart_threshold (int): Size from which the files are uploaded in parts
+            chunk_size (int): Size of the parts of the multipart uploads
+        Returns:
+            str: md5 of the file, or md5 of the md5 of the parts followed by -<parts> if the file
+                is uploaded in parts
+    '''
+    size = os.path.getsize(file_path)
+    if size < multipart_threshold:
+        file_hash = hashlib.md5()
+        with open(file_path, 'rb') as fp:
+            for chunk in iter(lambda: fp.read(_MB), b''):
+                file_hash.update(chunk)
+        return file_hash.hexdigest()
+
+    chunk_size = ChunksizeAdjuster().adjust_chunksize(chunk_size, size)
+    part_hashes = []
+    with open(file_path, 'rb') as fp:
+        for _ in range(math.ceil(size / chunk_size)):
+            part_hashes.append(hashlib.md5(fp.read(chunk_size)).digest())
+
+    return f"{hashlib.md5(b''.join(part_hashes)).hexdigest()}-{len(part_hashes)}"
+
+
+def _get_remote_etags(bucket: str, keys: set):
+    '''
+        Function to get the ETags of the objects in S3 that can be replaced by the files.
+        Parameters:
+            bucket (str): Bucket name
+            keys (set): Keys of the files to upload
+        Returns:
+            dict: ETag, without quotes, of each existing key
+    '''
+    # The objects are listed by the folders of the keys, one listing per folder instead of one request per file
+    prefixes = {key.rsplit('/', 1)[0] + '/' if '/' in key else key for key in keys}
+
+    etags = {}
+    paginator = _get_client().get_paginator('list_objects_v2')
+    for prefix in _get_top_prefixes(prefixes):
+        for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+            for item in page.get('Contents', []):
+                if item['Key'] in keys:
+                    etags[item['Key']] = item['ETag'].strip('"')
+
+    return etags
+
+
+def _get_top_prefixes(prefixes: set):
+    '''
+        Function to remove the prefixes already covered by a shorter one.
+        Parameters:
+            prefixes (set): Prefixes to list
+        Returns:
+            list: Prefixes that are not inside another one
+    '''
+    top = []
+    for prefix in sorted(prefixes):
+        if not any(prefix.startswith(parent) for parent in top):
+            top.append(prefix)
+    return top
+
+
+def _get_client():
+    '''
+        Function to get the S3 client of this process, created the first time with the endpoint of
+        the config and a connection pool big enough for all the upload threads.
+        Returns:
+            S3.Client: Client of the process
+    '''
+    global _CLIENT
+
+    with _CLIENT_LOCK:
+        if _CLIENT is None:
+            workers = config.getint('s3', 'workers', fallback=16)
+            _CLIENT = boto3.client(
+                's3',
+                endpoint_url=config.get('s3', 'endpoint_url', fallback='') or None,
+                region_name=config.get('s3', 'region', fallback='') or None,
+                config=Config(max_pool_connections=workers, retries={'max_attempts': 5, 'mode': 'standard'})
+            )
+    return _CLIENT
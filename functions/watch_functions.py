@@ -0,0 +1,85 @@
+import os
+import time
+from logger import logger
+from config import config
+from functions.cache_functions import set_memory_cache_entries
+from functions.catalog_functions import get_master_field_catalog
+from functions.generic_functions import find_last_lineage_file
+from functions.pipeline_functions import process_legacy, log_summary
+
+# Sheets parsed for each legacy, the memory cache keeps the last parse of all of them
+_SCHEMAS_PER_LEGACY = 2
+
+
+def watch_legacies(legacies: list, interval: float, profile: bool = None):
+    '''
+        Function to keep generating the outputs of some legacies every time a new version of their
+        lineage lands in the lineage folder, until the program is stopped.
+        The legacies run in this process, so the master fields catalog and the parsed lineages
+        stay in memory between runs. A legacy is generated once its last lineage has not changed
+        for one interval, so files still being copied are not read. A change in the master
+        fields generates all the legacies again, the manifest skips the tables that did not change.
+        Parameters:
+            legacies (list): Legacy names to watch
+            interval (float): Seconds between two checks of the lineage folder
+            profile (bool): None to run without profiling, otherwise profile each run of a legacy
+                and also collect its cProfile if True
+    '''
+    logger.info(f'Watching the lineages of {", ".join(legacies)} every {interval}s, press Ctrl+C to stop')
+    set_memory_cache_entries(_SCHEMAS_PER_LEGACY * len(legacies))
+    get_master_field_catalog()
+
+    generated = {}
+    previous = {}
+    try:
+        while True:
+            try:
+                current = {legacy: _get_lineage_state(legacy) for legacy in legacies}
+            except OSError as err:
+                # The lineage folder can be missing for a while (remounted, moved), check it again later
+                logger.error(f'Error checking the lineage folder: {err}')
+                time.sleep(interval)
+                continue
+            changed = [
+                legacy for legacy in legacies
+                if current[legacy] is not None
+                and current[legacy] == previous.get(legacy)
+                and current[legacy] != generated.get(legacy)
+            ]
+
+            if changed:
+                logger.info(f'New lineages for {", ".join(changed)}')
+                results = []
+                for legacy in changed:
+                    results.append(process_legacy(legacy, profile))
+                    # A failed run is not retried until the lineage changes again
+                    generated[legacy] = current[legacy]
+                log_summary(results)
+
+            previous = current
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        logger.info('Watch stopped.')
+
+
+def _get_lineage_state(legacy: str):
+    '''
+        Function to get the state of the inputs of a legacy, it changes when a new lineage lands,
+        the last lineage is modified or the master fields file is modified.
+        Parameters:
+            legacy (str): Legacy name
+        Returns:
+            tuple: Path, size and modification time of the last lineage and modification time of
+                the master fields, or None if the legacy has no lineage
+    '''
+    lineage_path = find_last_lineage_file(legacy)
+    if lineage_path is None:
+        return None
+
+    try:
+        lineage_stat = os.stat(lineage_path)
+        master_mtime = os.stat(config.getpath('folders', 'parameter_file_folder')).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+    return lineage_path, lineage_stat.st_size, lineage_stat.st_mtime_ns, master_mtime
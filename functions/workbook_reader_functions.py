@@ -0,0 +1,142 @@
+import datetime
+import openpyxl
+from logger import logger
+from config import config
+
+_ENGINES = ['openpyxl', 'calamine']
+
+try:
+    from python_calamine import CalamineWorkbook
+    _CALAMINE_AVAILABLE = True
+except ImportError:
+    _CALAMINE_AVAILABLE = False
+
+
+class OpenpyxlReader:
+    '''
+        Reader of a workbook with openpyxl in read-only mode, the rows are streamed from the file.
+        Parameters:
+            file_path (str): Path to the workbook.
+    '''
+    def __init__(self, file_path: str):
+        logger.debug(f'Opening workbook {file_path} with openpyxl')
+        self._workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True, keep_links=False)
+
+    @property
+    def sheet_names(self):
+        '''
+            Names of the sheets, in the order of the workbook.
+        '''
+        return self._workbook.sheetnames
+
+    def iter_rows(self, sheet: str):
+        '''
+            Function to iterate the rows of a sheet.
+            Parameters:
+                sheet (str): Sheet name
+            Returns:
+                iterator: Tuple with the cell values of each row, None for the empty cells
+        '''
+        worksheet = self._workbook[sheet]
+        # The dimensions saved by some tools are wrong, read the whole sheet
+        worksheet.reset_dimensions()
+        return worksheet.iter_rows(values_only=True)
+
+    def close(self):
+        '''
+            Close the workbook handle.
+        '''
+        self._workbook.close()
+
+
+class CalamineReader:
+    '''
+        Reader of a workbook with calamine, a native parser much faster than openpyxl. The values
+        are returned as openpyxl returns them, except for the text cells with only blanks that are
+        not saved with xml:space="preserve": calamine reads them as empty and openpyxl keeps the
+        blanks, so this reader is only used when it is chosen in the config.
+        Parameters:
+            file_path (str): Path to the workbook.
+    '''
+    def __init__(self, file_path: str):
+        logger.debug(f'Opening workbook {file_path} with calamine')
+        self._workbook = CalamineWorkbook.from_path(file_path)
+
+    @property
+    def sheet_names(self):
+        '''
+            Names of the sheets, in the order of the workbook.
+        '''
+        return self._workbook.sheet_names
+
+    def iter_rows(self, sheet: str):
+        '''
+            Function to iterate the rows of a sheet.
+            Parameters:
+                sheet (str): Sheet name
+            Returns:
+                iterator: Tuple with the cell values of each row, None for the empty cells
+        '''
+        # Keep the empty rows and columns before the data, so the positions match openpyxl
+        rows = self._workbook.get_sheet_by_name(sheet).to_python(skip_empty_area=False)
+        return (tuple(_convert_calamine_cell(value) for value in row) for row in rows)
+
+    def close(self):
+        '''
+            Close the workbook handle.
+        '''
+        self._workbook.close()
+
+
+def open_workbook_reader(file_path: str, engine: str = None):
+    '''
+        Function to open a workbook with the reader engine of the config. If calamine is chosen
+        but it is not installed, openpyxl is used.
+        Parameters:
+            file_path (str): Path to the workbook
+            engine (str): openpyxl or calamine, by default the one of the config
+        Returns:
+            Reader of the workbook
+        Exceptions:
+            ValueError: Raised if the engine is not valid
+    '''
+    engine = (engine or config.get('lineage', 'engine', fallback='openpyxl')).strip().lower()
+    if engine not in _ENGINES:
+        raise ValueError(f'Invalid lineage engine {engine}, use {" or ".join(_ENGINES)}')
+
+    if engine == 'calamine' and not _CALAMINE_AVAILABLE:
+        logger.warning('Lineage engine calamine is not installed, using openpyxl')
+        engine = 'openpyxl'
+
+    if engine == 'calamine':
+        return CalamineReader(file_path)
+    return OpenpyxlReader(file_path)
+
+
+def is_engine_available(engine: str):
+    '''
+        Function to check if a reader engine can be used.
+        Parameters:
+            engine (str): openpyxl or calamine
+        Returns:
+            bool: True if the engine is installed
+    '''
+    if engine == 'calamine':
+        return _CALAMINE_AVAILABLE
+    return engine == 'openpyxl'
+
+
+def _convert_calamine_cell(value):
+    '''
+        Function to convert a cell value of calamine to the value openpyxl returns for it.
+        Parameters:
+            value: Cell value read by calamine
+        Returns:
+            Cell value, None for the empty cells
+    '''
+    if isinstance(value, str):
+        return value if value != '' else None
+    # calamine returns the dates without time as date, openpyxl always as datetime
+    if isinstance(value, datetime.date) and not isinstance(value, datetime.datetime):
+        return datetime.datetime(value.year, value.month, value.day)
+    return value
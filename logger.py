@@ -1,13 +1,24 @@
 import logging
 from config import config
 
-# Configure logging
+# Logger of the program, it is configured by configure_logging when the program starts
 logger = logging.getLogger(__name__)
+# Loggers of the libraries that log every request, they are kept at WARNING even in DEBUG
+_QUIET_LOGGERS = ('boto3', 'botocore', 's3transfer', 'urllib3')
 
-log_level_str = config.get("logging", "level").upper()
-log_level = getattr(logging, log_level_str, logging.WARNING)
 
-logging.basicConfig(
-    level=log_level, 
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
\ No newline at end of file
+def configure_logging():
+    '''
+        Function to configure the logging with the level of the config.
+        It does nothing if the logging is already configured, so it can be called again from the
+        worker processes.
+    '''
+    log_level_str = config.get("logging", "level", fallback="INFO").upper()
+    log_level = getattr(logging, log_level_str, logging.WARNING)
+
+    logging.basicConfig(
+        level=log_level,
+        format='%(asctime)s - %(levelname)s - %(message)s'
+    )
+    for name in _QUIET_LOGGERS:
+        logging.getLogger(name).setLevel(max(log_level, logging.WARNING))
@@ -1,78 +1,41 @@
-import os
-import copy
-import pandas as pd
-from logger import logger
-from config import config
-from functions.dmstasks_functions import generate_dmstask
-from functions.government_tables_functions import generate_government_tables
-from functions.dataquality_functions import generate_dataquality
-from functions.generic_functions import (
-    validate_parameters,
-    create_folder_structure,
-    get_last_lineage_file,
-    parse_lineage_excel,
-    get_config
-)
+import sys
+from logger import logger, configure_logging
+from functions.cli_functions import validate_parameters
 
-# set directory to script path    
-os.chdir(os.path.dirname(os.path.abspath(__file__)))
-
-def main():
-    logger.info('Starting process.')
-    args = validate_parameters()
-    create_folder_structure(args.legado)
-
-    try:
-        lineage_excel_path = get_last_lineage_file(args.legado)
-        for schema in ['ruu', 'russ']:
-            process_schema(schema, args, lineage_excel_path)
-    except Exception as err:
-        logger.error(f'Error: {err}')
-    
-    logger.info('Process finished.')
 
+def main(argv: list = None):
+    args = validate_parameters(argv)
+    configure_logging()
 
-def process_schema(schema, args, lineage_excel_path):
-    """
-        Process the given schema to extract configuration and lineage data, and generate government tables.
+    if args.command == 'evaluate':
+        from functions.dqdl_functions import run_evaluation
+        # Exit with an error if a rule fails, so it can be used as a gate before deploying
+        return 0 if run_evaluation(args.ruleset, args.data, args.sep, args.report) else 1
+    if args.command == 'convert':
+        from functions.convert_functions import run_conversion
+        return 0 if run_conversion(args.legado, args.force) else 1
 
-        Parameters:
-            schema (str): The name of the schema to be processed.
-            args (Namespace): Command line arguments that include legacy information.
-            lineage_excel_path (str): The file path to the lineage Excel file.
-
-        This function retrieves configuration data for the schema, parses the lineage Excel to 
-        obtain lineage information, and checks for data availability. 
-        If lineage data is present, it generates government tables using the relevant lineage and 
-        configuration data.
-    """
-    logger.info(f'Processing schema {schema}')
-    config_df = get_config(schema)
-    lineage_df = parse_lineage_excel(args.legado, lineage_excel_path, schema)
-
-    if lineage_df.empty:
-        logger.info(f'No lineage found for {args.legado} in {schema}')
-        return
+    logger.info('Starting process.')
 
-    # Dmstask files
-    if config.getboolean('dmstask', 'active', fallback=False):
-        logger.info(f'Generating dmstask files for {args.legado} in {schema}')
-        generate_dmstask(copy.deepcopy(lineage_df).iloc[:, 0:4], config_df, args.legado, schema)
+    # The pipeline imports pandas and openpyxl, so it is loaded once the arguments are valid
+    profile = args.cprofile if args.profile else None
+    if args.watch:
+        from functions.watch_functions import watch_legacies
+        watch_legacies(args.legado, args.interval, profile)
+    else:
+        from functions.pipeline_functions import run_legacies, log_summary, get_available_legacies
+        # With --all only the legacies with a lineage are generated, the rest are not failures
+        legacies = get_available_legacies(args.legado) if args.all else args.legado
+        results = run_legacies(legacies, args.workers, profile)
+        log_summary(results)
+        if any(result['status'] != 'OK' for result in results):
+            logger.info('Process finished with errors.')
+            # Exit with an error, so the schedulers see the failed legacies
+            return 1
 
-    # Generate government tables files
-    if config.getboolean('government', 'active', fallback=False):
-        logger.info(f'Generating government tables files for {args.legado} in {schema}')
-        govement_df = copy.deepcopy(lineage_df)
-        govement_df = pd.concat([govement_df.iloc[:, 0], govement_df.iloc[:, 5:]], axis=1)
-        generate_government_tables(govement_df, config_df, args.legado)  
-    
-    # DataQuality files
-    if config.getboolean('dataquality', 'active', fallback=False):
-        logger.info(f'Generating DataQuality files for {args.legado} in {schema}')
-        dataquality_df = copy.deepcopy(lineage_df)
-        dataquality_df = pd.concat([dataquality_df.iloc[:, 0:2], dataquality_df.iloc[:, 4]], axis=1)
-        generate_dataquality(dataquality_df, config_df, args.legado, schema)
+    logger.info('Process finished.')
+    return 0
 
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    sys.exit(main())
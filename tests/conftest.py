@@ -0,0 +1,34 @@
+import configparser
+import os
+import sys
+import pytest
+
+_REPO_FOLDER = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, _REPO_FOLDER)
+
+from config import config  # noqa: E402
+
+
+@pytest.fixture
+def workspace(tmp_path):
+    '''
+        Fixture that points the config of the program to a copy of config.cfg inside a temporary
+        folder, so every relative path (inputs, outputs, cache) is resolved inside it.
+        The tests can change any value with config.set once the fixture is loaded.
+        Returns:
+            pathlib.Path: Folder of the workspace
+    '''
+    test_config = configparser.ConfigParser()
+    test_config.read(os.path.join(_REPO_FOLDER, 'cfg', 'configs', 'config.cfg'))
+    test_config['logging']['level'] = 'WARNING'
+
+    os.makedirs(tmp_path / 'cfg' / 'configs')
+    config_path = tmp_path / 'cfg' / 'configs' / 'config.cfg'
+    with open(config_path, 'w') as fp:
+        test_config.write(fp)
+
+    previous = (config.file_path, config.base_folder)
+    config.use_file(str(config_path), base_folder=str(tmp_path))
+    config.load()
+    yield tmp_path
+    config.use_file(*previous)
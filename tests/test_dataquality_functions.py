@@ -0,0 +1,38 @@
+import pandas as pd
+import pytest
+
+from functions.dataquality_functions import _generate_dataquality_rules  # noqa: E402
+from functions.dqdl_functions import parse_ruleset, render_rulesets  # noqa: E402
+
+# Formatted values of the lineage, the baseline generator wrote them as they are inside the brackets
+_FORMATTED_VALUES = [
+    'EN CURSO,FINALIZADO',
+    '"EN CURSO","FINALIZADO"',
+    '10 DIAS,20 DIAS',
+    '1,2',
+    '"A","B","C"',
+    'A,"B C",3',
+    'SÍ,NO',
+    'ESPAÑA,PORTUGAL',
+    'S-N,A/B,ALTA/BAJA',
+    'AÑO 2020,Nº 1',
+]
+
+
+@pytest.mark.parametrize('values', _FORMATTED_VALUES)
+def test_column_values_rule_matches_baseline_text(workspace, values):
+    df = pd.DataFrame({
+        'FIELD_NAME': ['ESTADO'],
+        'EXISTS': [True],
+        'VALORES_FORMATEADOS': [values],
+        'PRIMARY_KEY': ['N'],
+        'FIELD_LENGTH': [0]
+    })
+
+    ruleset, = render_rulesets(_generate_dataquality_rules(df, 'HSTA_EPISODIOS'), ['database'])
+
+    assert f'ColumnValues "ESTADO" in [{values}]' in ruleset
+    # The ruleset can be read back by evaluate, with each value of the lineage as one value
+    column_values, = [rule for rule in parse_ruleset(ruleset) if rule.rule_type == 'ColumnValues']
+    assert len(column_values.value) == len(values.split(','))
+    assert [str(value) for value in column_values.value] == [value.strip('"') for value in values.split(',')]
@@ -0,0 +1,48 @@
+import pandas as pd
+import pytest
+
+pytest.importorskip('pyarrow')
+
+from functions.dqdl_functions import DqNumber, DqRule, parse_ruleset, evaluate_ruleset, run_evaluation  # noqa: E402
+
+
+def test_parse_ruleset_keeps_multi_word_values_together():
+    rules = parse_ruleset('Rules = [ColumnValues "estado" in [EN CURSO, FINALIZADO], '
+                          'ColumnValues "plazo" in [10 DIAS, 20 DIAS], ColumnValues "tipo" in ["A B", 1, C]]')
+
+    assert rules == [
+        DqRule('ColumnValues', 'estado', 'in', ('EN CURSO', 'FINALIZADO')),
+        DqRule('ColumnValues', 'plazo', 'in', ('10 DIAS', '20 DIAS')),
+        DqRule('ColumnValues', 'tipo', 'in', ('A B', DqNumber('1'), 'C'))
+    ]
+    assert isinstance(rules[2].value[1], DqNumber)
+
+
+@pytest.mark.parametrize('values', ['"A" "B"', 'A,,B', '"A" B'])
+def test_parse_ruleset_rejects_values_without_comma(values):
+    with pytest.raises(ValueError):
+        parse_ruleset(f'Rules = [ColumnValues "estado" in [{values}]]')
+
+
+def test_evaluate_multi_word_values():
+    rules = parse_ruleset('Rules = [ColumnValues "estado" in [EN CURSO, FINALIZADO]]')
+    df = pd.DataFrame({'estado': ['EN CURSO', 'FINALIZADO', 'EN CURSO', 'CURSO']})
+
+    result, = evaluate_ruleset(rules, df)
+
+    assert (result['status'], result['passed_rows'], result['failed_rows']) == ('FAIL', 3, 1)
+
+
+@pytest.mark.parametrize('ruleset, extract', [
+    ('Rules = [IsComplete "a"]', ''),
+    ('Rules = [IsComplete "a"]', None),
+    ('Rules = [IsComplete a]', 'a\n1\n'),
+])
+def test_run_evaluation_reports_invalid_inputs(tmp_path, ruleset, extract):
+    ruleset_path = tmp_path / 'ruleset.txt'
+    ruleset_path.write_text(ruleset)
+    data_path = tmp_path / 'extract.csv'
+    if extract is not None:
+        data_path.write_text(extract)
+
+    assert run_evaluation(str(ruleset_path), str(data_path)) is False
@@ -0,0 +1,16 @@
+from functions.cli_functions import _LEGACIES
+from functions.pipeline_functions import get_available_legacies
+
+
+def test_all_keeps_only_the_legacies_with_lineage(workspace):
+    lineage_folder = workspace / 'inputs' / 'linajes'
+    lineage_folder.mkdir(parents=True)
+    for file_name in ['HSU_PNC_Linaje_de_datos v1.0.xlsx', 'HSU_APET_Linaje_de_datos v1.2.xlsx', '~$HSU_SOIC_Linaje.xlsx']:
+        (lineage_folder / file_name).touch()
+
+    assert get_available_legacies(_LEGACIES) == ['APET', 'PNC']
+
+
+def test_all_keeps_every_legacy_without_lineage_folder(workspace):
+    # The error of the missing folder is reported by each legacy
+    assert get_available_legacies(['APET', 'PNC']) == ['APET', 'PNC']
@@ -0,0 +1,79 @@
+import socket
+import pytest
+
+boto3 = pytest.importorskip('boto3')
+moto_server = pytest.importorskip('moto.server')
+
+from config import config  # noqa: E402
+import functions.s3_functions as s3_functions  # noqa: E402
+from functions.output_functions import create_legacy_output  # noqa: E402
+
+_MB = 1024 * 1024
+_BUCKET = 'releases'
+
+
+@pytest.fixture
+def s3_endpoint(workspace, monkeypatch):
+    '''
+        Fixture with a local S3 stand-in (moto server) configured as the endpoint of the upload.
+        Returns:
+            str: Endpoint url of the server
+    '''
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+
+    server = moto_server.ThreadedMotoServer(ip_address='127.0.0.1', port=port, verbose=False)
+    server.start()
+    endpoint_url = f'http://127.0.0.1:{port}'
+    config.set('s3', 'active', 'True')
+    config.set('s3', 'bucket', _BUCKET)
+    config.set('s3', 'prefix', 'outputs')
+    config.set('s3', 'endpoint_url', endpoint_url)
+    config.set('s3', 'region', 'us-east-1')
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'testing')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'testing')
+
+    # The client of the process is created again with the endpoint of this server
+    s3_functions._CLIENT = None
+    boto3.client('s3', endpoint_url=endpoint_url, region_name='us-east-1').create_bucket(Bucket=_BUCKET)
+    yield endpoint_url
+    s3_functions._CLIENT = None
+    server.stop()
+
+
+def _publish_outputs(sizes: dict):
+    '''
+        Function to write and publish some dmstask files of APET with the given sizes.
+        Parameters:
+            sizes (dict): Size in bytes of each file name
+        Returns:
+            LegacyOutput: Published outputs
+    '''
+    output = create_legacy_output('APET')
+    output.prepare()
+    for position, (name, size) in enumerate(sizes.items()):
+        with output.open('dmstask', name) as fp:
+            # Different content per file, so the parts of the files do not share hashes
+            fp.write((f'{position:x}' * size)[:size])
+    output.commit()
+    return output
+
+
+@pytest.mark.parametrize('threshold_mb, chunksize_mb, sizes', [
+    # Files between the chunk size and the threshold are uploaded in a single request
+    (10, 5, {'small.json': 1000, 'between.json': 6 * _MB, 'parts.json': 12 * _MB}),
+    # A file of exactly one chunk over the threshold is a multipart upload with one part
+    (5, 5, {'small.json': 1000, 'one_part.json': 5 * _MB, 'parts.json': 11 * _MB}),
+])
+def test_upload_skips_unchanged_files(s3_endpoint, threshold_mb, chunksize_mb, sizes):
+    config.set('s3', 'multipart_threshold_mb', str(threshold_mb))
+    config.set('s3', 'multipart_chunksize_mb', str(chunksize_mb))
+    output = _publish_outputs(sizes)
+
+    assert s3_functions.upload_outputs('APET', output) == {'uploaded': len(sizes), 'skipped': 0}
+    assert s3_functions.upload_outputs('APET', output) == {'uploaded': 0, 'skipped': len(sizes)}
+
+    # A changed file is uploaded again, the rest are still skipped
+    _publish_outputs({**sizes, 'small.json': 2000})
+    assert s3_functions.upload_outputs('APET', output) == {'uploaded': 1, 'skipped': len(sizes) - 1}
@@ -0,0 +1,21 @@
+from functions import watch_functions
+
+
+def test_watch_survives_a_missing_lineage_folder(workspace, monkeypatch):
+    lineage_folder = workspace / 'inputs' / 'linajes'
+    sleeps = []
+
+    def sleep(interval):
+        # The folder appears after the first check, the watch stops after the second one
+        sleeps.append(interval)
+        if len(sleeps) == 1:
+            lineage_folder.mkdir(parents=True)
+        else:
+            raise KeyboardInterrupt
+
+    monkeypatch.setattr(watch_functions, 'get_master_field_catalog', lambda: None)
+    monkeypatch.setattr(watch_functions.time, 'sleep', sleep)
+
+    watch_functions.watch_legacies(['APET'], 1)
+
+    assert sleeps == [1, 1]
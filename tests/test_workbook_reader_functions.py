@@ -0,0 +1,118 @@
+import datetime
+import os
+import sys
+import openpyxl
+import pandas as pd
+import pytest
+
+from functions.generic_functions import LineageWorkbook, _parse_lineage_and_extract_information, _read_sheet_columns
+from functions.workbook_reader_functions import open_workbook_reader
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+from synthetic_lineage import build_workspace  # noqa: E402
+
+_COLUMN_GROUPS = ['ORIGEN', 'DESTINO']
+
+
+def _calamine():
+    '''
+        Function to get the calamine engine, the test is skipped if it is not installed.
+    '''
+    pytest.importorskip('python_calamine')
+    return 'calamine'
+
+
+def _write_workbook(file_path, sheet_rows: dict):
+    '''
+        Function to write a workbook with openpyxl, a list of rows for each sheet.
+    '''
+    workbook = openpyxl.Workbook()
+    workbook.remove(workbook.active)
+    for sheet, rows in sheet_rows.items():
+        worksheet = workbook.create_sheet(sheet)
+        for row in rows:
+            worksheet.append(row)
+    workbook.save(file_path)
+
+
+def _read_columns(file_path, engine):
+    '''
+        Function to read the column groups of the RUU sheet of a workbook with an engine.
+    '''
+    reader = open_workbook_reader(str(file_path), engine)
+    try:
+        return _read_sheet_columns(reader.iter_rows('RUU'), _COLUMN_GROUPS)
+    finally:
+        reader.close()
+
+
+@pytest.fixture
+def tricky_workbook(tmp_path):
+    '''
+        Workbook with the cells that the engines return in a different way: numbers, floats,
+        dates, booleans, errors, NA strings, empty header cells of merged groups, blank rows
+        and an empty leading column.
+    '''
+    file_path = tmp_path / 'tricky.xlsx'
+    _write_workbook(file_path, {'RUU': [
+        [None, 'ORIGEN', None, None, 'DESTINO', None, None, 'OTROS'],
+        [None, 'TABLA', 'CAMPO', 'VALOR', 'TABLA', 'CAMPO', None, 'NOTA'],
+        [None, 'T1', 'ID', 1, 'D1', 'ID', 'x', 'a'],
+        [None, 'T1', 'IMPORTE', 2.5, 'D1', 'IMPORTE', 'y', 'b'],
+        [None, None, None, None, None, None, None, 'sin valores'],
+        [None, 'T1', 'FECHA', datetime.datetime(2024, 3, 1), 'D1', 'FECHA', datetime.datetime(2024, 3, 1, 12, 30), None],
+        [None, 'T1', 'ACTIVO', 10.0, 'D1', 'ACTIVO', False, None],
+        [None, 'T1', 'ERROR', '#N/A', 'D1', 'NA', 'NA', None],
+        [None, 'T2', 'TEXTO', 'con espacios ', 'D2', 'N/A', '', None],
+    ]})
+    return file_path
+
+
+def test_read_sheet_columns_matches_read_excel(tricky_workbook):
+    # Same values as pandas.read_excel with dtype=str, without the rows that have no values in the groups
+    src_df = _read_columns(tricky_workbook, 'openpyxl')
+
+    expected = pd.read_excel(tricky_workbook, sheet_name='RUU', header=[0, 1], dtype=str, engine='openpyxl')
+    expected = expected[[column for column in expected.columns if column[0] in _COLUMN_GROUPS]]
+    expected = expected.dropna(how='all').reset_index(drop=True).astype(object)
+
+    pd.testing.assert_frame_equal(src_df, expected)
+
+
+def test_calamine_matches_openpyxl(tricky_workbook):
+    engine = _calamine()
+
+    pd.testing.assert_frame_equal(_read_columns(tricky_workbook, engine), _read_columns(tricky_workbook, 'openpyxl'))
+
+
+def test_calamine_matches_openpyxl_on_synthetic_lineage(tmp_path):
+    engine = _calamine()
+    _, lineage_path = build_workspace(str(tmp_path), 'APET', 40, 20, seed=3)
+
+    def parse(engine):
+        with LineageWorkbook(lineage_path, engine) as workbook:
+            return {schema: _parse_lineage_and_extract_information(workbook, schema) for schema in ['ruu', 'russ']}
+
+    expected = parse('openpyxl')
+    for schema, lineage_df in parse(engine).items():
+        assert len(lineage_df) > 0
+        pd.testing.assert_frame_equal(lineage_df, expected[schema])
+
+
+@pytest.mark.xfail(strict=True, reason='calamine reads the text cells with only blanks as empty cells '
+                                       'when they are not saved with xml:space="preserve"')
+def test_calamine_keeps_blank_text_cells(tmp_path):
+    engine = _calamine()
+    file_path = tmp_path / 'blanks.xlsx'
+    _write_workbook(file_path, {'RUU': [
+        ['ORIGEN', None],
+        ['TABLA', 'CAMPO'],
+        ['T1', ' '],
+    ]})
+
+    pd.testing.assert_frame_equal(_read_columns(file_path, engine), _read_columns(file_path, 'openpyxl'))
+
+
+def test_unknown_engine_is_rejected(tricky_workbook):
+    with pytest.raises(ValueError):
+        open_workbook_reader(str(tricky_workbook), 'parquet')